@@ -0,0 +1,107 @@
+"""CSC110 Fall 2020 Project Final Submission
+===============================
+
+This Python module renders every chart of visualisation_functions to image files
+without opening any window, using a pool of worker processes.
+
+Instructions as follows:
+Run this module, or call render_all, to save all the charts to the charts folder.
+The dataset is loaded once before the workers start, and the workers share it.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of students
+taking CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2020 Ipek Akyol, Yumna Refai, Helia Sajjadian Moosavi .
+"""
+import contextlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+
+import get_data
+import storage
+import visualisation_functions
+
+charts_folder = r'charts'
+
+pollutant_names = ["CO", "CO2", "NOx", "SO2", "NMVOCs", "PM2.5", "BC", "OC"]
+
+charts = [(f"linear_regression_{pollutant}", "draw_linear_regression", (pollutant,))
+          for pollutant in pollutant_names] + [
+    ("pie_chart_source", "draw_pie_chart_source", ()),
+    ("bar_plot_source", "draw_bar_plot_source", ()),
+    ("pie_chart_industry", "draw_pie_chart_industry", ()),
+    ("bar_plot_industry", "draw_bar_plot_industry", ()),
+    ("pie_chart_mobile", "draw_pie_chart_mobile", ())
+]
+
+
+def render_chart(name: str, function_name: str, args: tuple, folder: str = charts_folder,
+                 image_format: str = 'png') -> str:
+    """Draw a chart by calling the function of visualisation_functions with the function_name
+    on the args, save it to the folder as name.image_format and return the file name.
+
+    What the drawing function prints is discarded.
+    """
+    file_name = os.path.join(folder, f"{name}.{image_format}")
+    plt.close('all')
+    with contextlib.redirect_stdout(io.StringIO()):
+        getattr(visualisation_functions, function_name)(*args)
+    plt.gcf().savefig(file_name, bbox_inches='tight')
+    plt.close('all')
+    return file_name
+
+
+def render_all(folder: str = charts_folder, image_format: str = 'png',
+               processes: Optional[int] = None,
+               file_name: str = get_data.file_path) -> list[str]:
+    """Save every chart of visualisation_functions to the folder and return the names of the
+    image files, drawing the charts in a pool of processes.
+
+    The charts are drawn from the dataset in the file with the file_name. It is loaded before
+    the pool starts, so the workers inherit it instead of loading it again.
+    """
+    os.makedirs(folder, exist_ok=True)
+    storage.get_dataset(file_name)
+    with ProcessPoolExecutor(processes, initializer=_start_worker,
+                             initargs=(file_name,)) as executor:
+        futures = [executor.submit(render_chart, name, function_name, args, folder,
+                                   image_format)
+                   for name, function_name, args in charts]
+        return [future.result() for future in futures]
+
+
+def _start_worker(file_name: str) -> None:
+    """Prepare a worker process of render_all: make the dataset in the file with the file_name
+    the default dataset of storage.get_dataset, which the functions of visualisation_functions
+    draw. A worker forked from the parent process already has the dataset loaded.
+    """
+    if file_name != get_data.file_path:
+        storage.set_dataset(storage.get_dataset(file_name))
+
+
+if __name__ == '__main__':
+    for image in render_all():
+        print(image)
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ["contextlib", "io", "os", "concurrent.futures", "typing",
+                          "matplotlib", "matplotlib.pyplot", "get_data", "storage",
+                          "visualisation_functions"],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200', 'C0413']
+    })
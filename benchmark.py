@@ -0,0 +1,283 @@
+"""CSC110 Fall 2020 Project Final Submission
+===============================
+
+This Python module contains the benchmarks of the loading, organizing and aggregating
+functions of get_data, run on synthetic datasets with the same layout as data.xlsx and
+data.csv.
+
+Instructions as follows:
+Run this module to benchmark every stage on a synthetic dataset and print the results.
+Call run_benchmarks with more days, regions or industries to benchmark larger datasets,
+save_baseline to keep the results of a run and compare_to_baseline to find the stages that
+became slower since then.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of students
+taking CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2020 Ipek Akyol, Yumna Refai, Helia Sajjadian Moosavi .
+"""
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+import get_data
+
+pollutant_names = ["SO2", "NOx", "CO", "CO2", "NMVOCs", "PM2.5", "BC", "OC"]
+baseline_path = r'benchmark_baseline.json'
+
+import_budgets = {
+    "get_data": (0.5, ["pandas", "sklearn", "openpyxl", "matplotlib", "python_ta"]),
+    "storage": (0.5, ["pandas", "sklearn", "openpyxl", "matplotlib", "python_ta"]),
+    "trends": (0.5, ["pandas", "sklearn", "openpyxl", "matplotlib", "python_ta"]),
+    "benchmark": (0.5, ["pandas", "sklearn", "openpyxl", "matplotlib", "python_ta"]),
+    "cli": (0.5, ["pandas", "sklearn", "openpyxl", "matplotlib", "python_ta"]),
+    "server": (0.5, ["pandas", "sklearn", "openpyxl", "matplotlib", "python_ta"]),
+    "tiles": (0.5, ["pandas", "sklearn", "openpyxl", "matplotlib", "python_ta"]),
+    "charts": (2.0, ["pandas", "sklearn", "openpyxl", "matplotlib.pyplot", "python_ta"]),
+    "visualisation_functions": (2.5, ["pandas", "sklearn", "openpyxl", "python_ta"])
+}
+
+
+def make_raw_data(days: int = 730, industries_per_source: int = 5,
+                  start: datetime = datetime(2019, 1, 1), seed: int = 0) -> get_data.RawData:
+    """Return a random data table with the given number of days from start and the given
+    number of industries in each main source, laid out like the table in data.xlsx. By default
+    the table covers 2019 and 2020, the two periods compared by get_data.
+
+    The total of each source is the sum of its industries and the total of each pollutant is
+    the sum of its sources. CO2 is given in kton like in the real dataset.
+    """
+    rng = np.random.default_rng(seed)
+    sources, pollutants, units, columns = [], [], [], []
+    for pollutant in pollutant_names:
+        unit = "kton" if pollutant == "CO2" else "ton"
+        source_columns = []
+        for source in get_data.main_sources:
+            industries = rng.uniform(1.0, 1000.0, (days, industries_per_source))
+            source_columns.append(industries.sum(axis=1))
+            sources.append(source)
+            columns.append(source_columns[-1])
+            for k in range(industries_per_source):
+                sources.append(f"  {source} industry {k + 1}")
+                columns.append(industries[:, k])
+        sources.append("Total")
+        columns.append(np.sum(source_columns, axis=0))
+        pollutants.extend([pollutant] * (len(sources) - len(pollutants)))
+        units.extend([unit] * (len(sources) - len(units)))
+    return get_data.RawData(sources, pollutants, units,
+                            [start + timedelta(days=d) for d in range(days)],
+                            np.stack(columns, axis=1))
+
+
+def write_csv(data: get_data.RawData, file_name: str) -> None:
+    """Write the data table to the file with the file_name in the layout of data.csv.
+    """
+    with open(file_name, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["", "Sources", "Pollutants", "Units", "2019 base", "2020 base"]
+                        + [str(date) for date in data.dates])
+        for i in range(len(data.sources)):
+            writer.writerow([i, data.sources[i], data.pollutants[i], data.units[i],
+                             data.values[0, i], data.values[0, i]]
+                            + data.values[:, i].tolist())
+
+
+def write_xlsx(data: get_data.RawData, file_name: str) -> None:
+    """Write the data table to the file with the file_name in the layout of data.xlsx.
+    """
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = wb.create_sheet()
+    sheet.append(["Sources", "Pollutants", "Units", "2019 base", "2020 base"])
+    sheet.append(["Date", None, None, None, None] + list(data.dates))
+    for i in range(len(data.sources)):
+        sheet.append([data.sources[i], data.pollutants[i], data.units[i],
+                      data.values[0, i], data.values[0, i]] + data.values[:, i].tolist())
+    wb.save(file_name)
+
+
+def measure(stage: str, function: Callable, *args: Any, repeat: int = 3,
+            setup: Optional[Callable] = None) -> dict:
+    """Return the measurements of calling the function with the args: the best wall time of
+    repeat calls, the peak resident set size of the process so far, and the peak size of
+    the memory allocated by one more call traced by tracemalloc together with the number of
+    memory blocks still allocated when it returns.
+
+    If setup is not None, it is called before each call of the function, outside of the
+    measurements.
+    """
+    seconds = float('inf')
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function(*args)
+        seconds = min(seconds, time.perf_counter() - start)
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss_kb /= 1024
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    before = len(tracemalloc.take_snapshot().traces)
+    result = function(*args)
+    allocated_blocks = len(tracemalloc.take_snapshot().traces) - before
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {'stage': stage, 'seconds': seconds, 'peak_rss_kb': peak_rss_kb,
+            'peak_allocated_kb': peak / 1024, 'allocated_blocks': allocated_blocks}
+
+
+def run_benchmarks(days: int = 730, regions: int = 1, industries_per_source: int = 5,
+                   repeat: int = 3, with_xlsx: bool = True) -> list[dict]:
+    """Return the measurements of every stage on synthetic datasets with the given number of
+    days, regions and industries in each source. Each region is a separate data table, and
+    every stage is run on all regions.
+    """
+    tables = [make_raw_data(days, industries_per_source, seed=r) for r in range(regions)]
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        csv_files = [os.path.join(folder, f"region{r}.csv") for r in range(regions)]
+        for table, file_name in zip(tables, csv_files):
+            write_csv(table, file_name)
+        results.append(measure("with_csv", _each, get_data.with_csv, csv_files, repeat=repeat))
+        if with_xlsx:
+            xlsx_files = [os.path.join(folder, f"region{r}.xlsx") for r in range(regions)]
+            for table, file_name in zip(tables, xlsx_files):
+                write_xlsx(table, file_name)
+            results.append(measure("with_openpyxl", _each, get_data.with_openpyxl, xlsx_files,
+                                   repeat=repeat))
+
+    results.append(measure("get_organized_data", _each, get_data.get_organized_data, tables,
+                           repeat=repeat))
+    cubes = [get_data.get_organized_data(table) for table in tables]
+    results.append(measure("running_totals", _each, get_data.EmissionsCube.running_totals, cubes,
+                           repeat=repeat, setup=lambda: _reset_running(cubes)))
+    # The aggregations are memoized, so the memo is cleared before every call to time them
+    # cold, as the first request on a dataset would see them.
+    for function in [get_data.get_total_per_source, get_data.get_total_per_industry,
+                     get_data.get_data_for_pie_chart_source,
+                     get_data.get_data_for_pie_chart_industry,
+                     get_data.get_data_for_pie_chart_mobile, get_data.get_data_for_bar_source,
+                     get_data.get_data_for_bar_industry]:
+        results.append(measure(f"{function.__name__} (cold)", _each, function, cubes,
+                               repeat=repeat, setup=get_data.clear_memo))
+    results.append(measure("get_data_for_linear_regression (cold)", _each,
+                           lambda cube: get_data.get_data_for_linear_regression(cube, "CO"),
+                           cubes, repeat=repeat, setup=get_data.clear_memo))
+    for result in results:
+        result.update({'days': days, 'regions': regions,
+                       'industries_per_source': industries_per_source})
+    return results
+
+
+def _reset_running(cubes: list[get_data.EmissionsCube]) -> None:
+    """Drop the running totals of the cubes, so the next call to running_totals computes them.
+    """
+    for cube in cubes:
+        cube.running = None
+
+
+def _each(function: Callable, inputs: list) -> list:
+    """Return the list of the results of calling the function on each of the inputs.
+    """
+    return [function(value) for value in inputs]
+
+
+def save_baseline(results: list[dict], file_name: str = baseline_path) -> None:
+    """Save the benchmark results to the file with the file_name.
+    """
+    with open(file_name, 'w') as file:
+        json.dump(results, file, indent=2)
+
+
+def compare_to_baseline(results: list[dict], file_name: str = baseline_path,
+                        tolerance: float = 1.2) -> list[tuple[str, float, float]]:
+    """Return the stage, the baseline time and the new time of each stage in the results
+    that took more than tolerance times as long as in the baseline saved in the file with
+    the file_name for the same dataset size.
+    """
+    with open(file_name) as file:
+        baseline = {(result['stage'], result['days'], result['regions'],
+                     result['industries_per_source']): result['seconds']
+                    for result in json.load(file)}
+    regressions = []
+    for result in results:
+        key = (result['stage'], result['days'], result['regions'],
+               result['industries_per_source'])
+        if key in baseline and result['seconds'] > tolerance * baseline[key]:
+            regressions.append((result['stage'], baseline[key], result['seconds']))
+    return regressions
+
+
+def check_import_budget(budgets: dict[str, tuple[float, list[str]]] = import_budgets,
+                        repeat: int = 3) -> list[str]:
+    """Return a description of each problem found when importing each module of the budgets
+    in a new interpreter: the best time of repeat imports is more than the number of seconds
+    of its budget, or the import loaded one of the modules listed in its budget.
+
+    The budgets keep the heavy dependencies out of the start-up of short-lived workers:
+    scikit-learn is only imported by the linear regression, openpyxl by the loading of xlsx
+    files, pandas by the DataFrame builders and python_ta never outside of a main block.
+    """
+    folder = os.path.dirname(os.path.abspath(__file__))
+    problems = []
+    for module, (budget, forbidden) in budgets.items():
+        code = (f"import sys, time\nstart = time.perf_counter()\nimport {module}\n"
+                f"print(time.perf_counter() - start)\nprint(' '.join(sys.modules))")
+        seconds = float('inf')
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                    check=True, cwd=folder).stdout.splitlines()
+            seconds = min(seconds, float(output[0]))
+        if seconds > budget:
+            problems.append(f"importing {module} took {seconds:.3f}s, over its budget of "
+                            f"{budget}s")
+        loaded = set(output[1].split())
+        for name in forbidden:
+            if name in loaded:
+                problems.append(f"importing {module} also imported {name}")
+    return problems
+
+
+def print_results(results: list[dict]) -> None:
+    """Print the benchmark results as a table.
+    """
+    print(f"{'stage':<40}{'ms':>10}{'peak RSS MB':>14}{'peak alloc MB':>15}{'blocks':>10}")
+    for result in results:
+        print(f"{result['stage']:<40}{result['seconds'] * 1000:>10.2f}"
+              f"{result['peak_rss_kb'] / 1024:>14.1f}"
+              f"{result['peak_allocated_kb'] / 1024:>15.2f}{result['allocated_blocks']:>10}")
+
+
+if __name__ == '__main__':
+    print_results(run_benchmarks())
+    for problem in check_import_budget():
+        print(problem)
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ["csv", "json", "os", "resource", "subprocess", "sys", "tempfile",
+                          "time", "tracemalloc", "datetime", "typing", "numpy", "openpyxl",
+                          "get_data"],
+        'allowed-io': ["write_csv", "save_baseline", "compare_to_baseline", "print_results"],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
@@ -0,0 +1,234 @@
+"""CSC110 Fall 2020 Project Final Submission
+===============================
+
+This Python module draws the charts of visualisation_functions straight from the totals
+computed by get_data, without going through pandas or pyplot, and renders them to images.
+
+Instructions as follows:
+Call render with the name of a chart to get the image of the chart as bytes, or save to
+write it to a file. Each chart keeps its own figure, which is cleared and reused every
+time the chart is rendered. Importing this module does not import pandas or scikit-learn,
+so it can be used by short-lived workers and services.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of students
+taking CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2020 Ipek Akyol, Yumna Refai, Helia Sajjadian Moosavi .
+"""
+import io
+import os
+import threading
+from typing import Any, Callable, Optional
+
+import numpy as np
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PatchCollection
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.patches import Patch, Rectangle, Wedge
+
+import get_data
+import instrumentation
+import storage
+import trends
+
+_figures = {}
+_figures_lock = threading.Lock()
+
+
+def _colors(count: int) -> list[str]:
+    """Return the colors of the default matplotlib color cycle for count patches.
+    """
+    return [f"C{k % 10}" for k in range(count)]
+
+
+def _draw_pie(axes: Axes, names: list[str], values: np.ndarray, percentages: bool) -> None:
+    """Draw a pie chart of the values on the axes, with one wedge for each name, optionally
+    labelled with its percentage of the whole pie.
+    """
+    angles = np.concatenate([[0.0], np.cumsum(values) / values.sum() * 360])
+    colors = _colors(len(names))
+    axes.add_collection(PatchCollection(
+        [Wedge((0, 0), 1, angles[k], angles[k + 1]) for k in range(len(names))],
+        facecolors=colors, edgecolors='none'))
+    if percentages:
+        middles = np.radians((angles[:-1] + angles[1:]) / 2)
+        for k in range(len(names)):
+            axes.text(0.6 * np.cos(middles[k]), 0.6 * np.sin(middles[k]),
+                      f"{(angles[k + 1] - angles[k]) / 3.6:.0f}%", ha='center', va='center')
+    axes.set_xlim(-1.1, 1.1)
+    axes.set_ylim(-1.1, 1.1)
+    axes.set_aspect('equal')
+    axes.set_axis_off()
+    axes.legend([Patch(facecolor=color) for color in colors], names, loc='best')
+
+
+def _draw_bars(axes: Axes, names: list[str], totals: dict[str, tuple[float, float]],
+               periods: list[str], fontsize: int, rotation: int) -> None:
+    """Draw a bar plot on the axes with two bars for each name, the totals of the name in
+    the two periods, with the names of the periods in the legend.
+    """
+    values = np.array([totals[name] for name in names])
+    positions = np.arange(len(names))
+    width = 0.25
+    for k, color in enumerate(_colors(2)):
+        axes.add_collection(PatchCollection(
+            [Rectangle((positions[i] + (k - 1) * width, 0), width, values[i, k])
+             for i in range(len(names))], facecolors=color, edgecolors='none'))
+    axes.set_xlim(-0.5, len(names) - 0.5)
+    axes.set_ylim(0, values.max() * 1.05)
+    axes.set_xticks(positions)
+    axes.set_xticklabels(names, fontsize=fontsize, rotation=rotation)
+    axes.legend([Patch(facecolor=color) for color in _colors(2)], periods, loc='best',
+                title=f'{periods[0]} vs {periods[1]}', title_fontsize=8)
+
+
+def draw_pie_chart_source(axes: Axes, dataset: get_data.EmissionsCube,
+                          baseline: get_data.Period = get_data.before_covid,
+                          comparison: get_data.Period = get_data.during_covid) -> None:
+    """Draw on the axes the pie chart of draw_pie_chart_source in visualisation_functions.
+    """
+    decreases = get_data.get_decrease_per_source(dataset, baseline, comparison)
+    _draw_pie(axes, list(decreases), np.array(list(decreases.values())), True)
+    axes.get_legend().set_title('Types of Sources')
+    axes.set_title('Weighted Decrease in Pollutant Emissions by Each Source')
+
+
+def draw_bar_plot_source(axes: Axes, dataset: get_data.EmissionsCube,
+                         baseline: get_data.Period = get_data.before_covid,
+                         comparison: get_data.Period = get_data.during_covid) -> None:
+    """Draw on the axes the bar plot of draw_bar_plot_source in visualisation_functions.
+    """
+    _draw_bars(axes, dataset.sources,
+               get_data.get_total_per_source(dataset, baseline, comparison),
+               [baseline.name, comparison.name], 8, 10)
+    axes.set_xlabel('Type of Sources', fontsize=8)
+    axes.set_ylabel('Total of All the Pollutant Gases Emitted (tons)', fontsize=8)
+    axes.set_title('Total of all the pollutant gases emitted by each source before and '
+                   'during Covid', fontsize=8)
+
+
+def draw_pie_chart_industry(axes: Axes, dataset: get_data.EmissionsCube,
+                            baseline: get_data.Period = get_data.before_covid,
+                            comparison: get_data.Period = get_data.during_covid) -> None:
+    """Draw on the axes the pie chart of draw_pie_chart_industry in visualisation_functions.
+    """
+    decreases = get_data.get_decrease_per_industry(dataset, baseline, comparison)
+    _draw_pie(axes, list(decreases), np.array(list(decreases.values())), False)
+    legend = axes.get_legend()
+    legend.set_title('Industries of Sources')
+    for text in legend.get_texts():
+        text.set_fontsize(5)
+    axes.set_title('Weighted decrease of emission for each industry')
+
+
+def draw_bar_plot_industry(axes: Axes, dataset: get_data.EmissionsCube,
+                           baseline: get_data.Period = get_data.before_covid,
+                           comparison: get_data.Period = get_data.during_covid) -> None:
+    """Draw on the axes the bar plot of draw_bar_plot_industry in visualisation_functions.
+    """
+    _draw_bars(axes, dataset.industries,
+               get_data.get_total_per_industry(dataset, baseline, comparison),
+               [baseline.name, comparison.name], 6, 90)
+    axes.set_xlabel('Type of Industries', fontsize=8)
+    axes.set_ylabel('Total of All the Pollutant Gases Emitted (tons)', fontsize=6)
+    axes.set_title('Total of all the pollutant gases emitted by each industry before and '
+                   'during Covid', fontsize=8)
+
+
+def draw_pie_chart_mobile(axes: Axes, dataset: get_data.EmissionsCube,
+                          baseline: get_data.Period = get_data.before_covid,
+                          comparison: get_data.Period = get_data.during_covid) -> None:
+    """Draw on the axes the pie chart of draw_pie_chart_mobile in visualisation_functions.
+    """
+    decreases = get_data.get_decrease_per_mobile_pollutant(dataset, baseline, comparison)
+    _draw_pie(axes, list(decreases), np.array(list(decreases.values())), True)
+    axes.get_legend().set_title('Types of Pollutants')
+    axes.set_title('The Weighted decrease of emission for each pollutant produced by '
+                   'Mobile Sources', fontsize=8)
+
+
+def draw_linear_regression(axes: Axes, dataset: get_data.EmissionsCube,
+                           pollutant: str = "CO") -> None:
+    """Draw on the axes the scatter plot of the total emission of the pollutant on each day
+    drawn by draw_linear_regression in visualisation_functions.
+
+    Preconditions:
+      - pollutant in dataset.pollutant_index
+    """
+    axes.add_line(Line2D(trends.get_days(dataset),
+                         dataset.pollutant_totals[:, dataset.pollutant_index[pollutant]],
+                         linestyle='none', marker='o'))
+    axes.autoscale_view()
+    axes.legend([pollutant], loc='best')
+    axes.set_title('Predicting trends in emissions during Covid')
+    axes.set_xlabel('Time (Days)')
+    axes.set_ylabel('Total Pollutant Emissions (tons)')
+
+
+drawers = {
+    "pie_chart_source": draw_pie_chart_source,
+    "bar_plot_source": draw_bar_plot_source,
+    "pie_chart_industry": draw_pie_chart_industry,
+    "bar_plot_industry": draw_bar_plot_industry,
+    "pie_chart_mobile": draw_pie_chart_mobile,
+    "linear_regression": draw_linear_regression
+}
+
+
+@instrumentation.timed
+def render(chart: str, dataset: Optional[get_data.EmissionsCube] = None,
+           image_format: str = 'png', dpi: int = 100, **params: Any) -> bytes:
+    """Return the image of the chart with the given name in the given format, drawn from the
+    dataset, or from storage.get_dataset() if dataset is None. The params are passed on to
+    the drawing function of the chart, for example the baseline and comparison periods or
+    the pollutant of a linear regression chart.
+
+    Preconditions:
+        - chart in drawers
+    """
+    if dataset is None:
+        dataset = storage.get_dataset()
+    drawer: Callable = drawers[chart]
+    with _figures_lock:
+        if chart not in _figures:
+            figure = Figure(figsize=(8, 6))
+            FigureCanvasAgg(figure)
+            _figures[chart] = (figure, figure.add_subplot())
+            figure.subplots_adjust(bottom=0.38 if chart == "bar_plot_industry" else 0.12)
+        figure, axes = _figures[chart]
+        axes.clear()
+        drawer(axes, dataset, **params)
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format=image_format, dpi=dpi)
+    return buffer.getvalue()
+
+
+def save(chart: str, file_name: str, dataset: Optional[get_data.EmissionsCube] = None,
+         **params: Any) -> None:
+    """Render the chart with the given name like render and write the image to the file with
+    the file_name, in the format given by its extension.
+    """
+    image_format = os.path.splitext(file_name)[1][1:] or 'png'
+    image = render(chart, dataset, image_format, **params)
+    with open(file_name, 'wb') as file:
+        file.write(image)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ["io", "os", "threading", "typing", "numpy", "matplotlib.axes",
+                          "matplotlib.backends.backend_agg", "matplotlib.collections",
+                          "matplotlib.figure", "matplotlib.lines", "matplotlib.patches",
+                          "get_data", "instrumentation", "storage", "trends"],
+        'allowed-io': ["save"],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
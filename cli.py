@@ -0,0 +1,364 @@
+"""CSC110 Fall 2020 Project Final Submission
+===============================
+
+This Python module is the command line interface of the project. Each subcommand runs one
+job on the dataset and writes its results to the standard output, one row at a time.
+
+Instructions as follows:
+Run python main.py followed by a subcommand, for example
+
+    python main.py compare --by source
+    python main.py --format json aggregate --by industry --start 2020-01-23 --end 2020-04-08
+    python main.py regress --pollutant CO --degree 2 --totals-only
+    python main.py render pie_chart_source bar_plot_source
+
+and add --help after a subcommand to see its options. The subcommands are:
+    - ingest: parse the dataset file into the cache, and optionally into a region of the store
+    or a Parquet file
+    - aggregate: the total emission by each pollutant, source or industry over a range of days
+    - compare: the totals by each source, industry or pollutant in two periods
+    - regress: the polynomial trends of the daily series of emissions
+    - render: save the charts to image files, through the tile cache of tiles.py
+    - bench: run the benchmarks
+    - serve: answer queries over HTTP with server.py
+
+The dataset is read from the cache written by storage.load_cached_data, so the dataset file
+is only parsed again when it changes, or from a region of the store with --store, in which
+case only the days and pollutants a subcommand uses are read from disk. Rows are written as
+csv, or with --format json as one JSON object per line.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of students
+taking CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2020 Ipek Akyol, Yumna Refai, Helia Sajjadian Moosavi .
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, TextIO
+
+import get_data
+import storage
+import tiles
+
+
+def parse_period(text: str) -> get_data.Period:
+    """Return the period described by the text, as read by get_data.parse_period.
+    """
+    try:
+        return get_data.parse_period(text)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def parse_day(text: str) -> datetime:
+    """Return the day written in ISO format in the text.
+    """
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid day: {text!r}")
+
+
+def parse_chart(text: str) -> str:
+    """Return the name of the chart in the text, which must be one of tiles.chart_names.
+    """
+    if text not in tiles.chart_names:
+        raise argparse.ArgumentTypeError(
+            f"invalid chart: {text!r} (choose from {', '.join(tiles.chart_names)})")
+    return text
+
+
+def write_rows(rows: Iterator[dict], output_format: str = 'csv',
+               file: Optional[TextIO] = None) -> None:
+    """Write the rows to the file, or to the standard output if file is None, as they are
+    produced, as csv with a header taken from the keys of the first row, or as one JSON object
+    per line if output_format is 'json'.
+    """
+    if file is None:
+        file = sys.stdout
+    writer = None
+    for row in rows:
+        if output_format == 'json':
+            file.write(json.dumps(row, default=str) + '\n')
+        else:
+            if writer is None:
+                writer = csv.DictWriter(file, list(row), lineterminator='\n')
+                writer.writeheader()
+            writer.writerow(row)
+
+
+def get_dataset(args: argparse.Namespace) -> get_data.EmissionsCube:
+    """Return the dataset the subcommand runs on: the region of the store in the folder given
+    by --store, memory-mapped from disk, or else the cached dataset of the file given by --file.
+    """
+    if args.store is not None:
+        return storage.open_store(args.store, args.region)
+    else:
+        return storage.get_dataset(args.file)
+
+
+def get_pollutants(args: argparse.Namespace, dataset: get_data.EmissionsCube) -> list[str]:
+    """Return the pollutants given by --pollutant, or all the pollutants of the dataset if
+    there are none. Raise argparse.ArgumentTypeError if any of them is not in the dataset.
+    """
+    unknown = [pollutant for pollutant in args.pollutant or []
+               if pollutant not in dataset.pollutant_index]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown pollutant {', '.join(unknown)} (choose from {', '.join(dataset.pollutants)})")
+    return args.pollutant or dataset.pollutants
+
+
+def run_ingest(args: argparse.Namespace) -> Iterator[dict]:
+    """Parse the dataset file into the cache. With --store, also save the dataset as the region
+    of the store, or with --append only add the days after the last day already in the region.
+    With --parquet, also export the dataset to a Parquet file with storage.export_parquet.
+    """
+    cube = storage.load_cached_data(args.file)
+    written = 0
+    if args.store is not None:
+        region_exists = os.path.exists(os.path.join(args.store, args.region, 'index.json'))
+        if args.append and region_exists:
+            last_day = storage.open_store(args.store, args.region).dates[-1]
+            new_days = cube.between(last_day + timedelta(days=1), datetime.max)
+            if len(new_days) > 0:
+                storage.append_store(new_days, args.store, args.region)
+            written = len(new_days)
+        else:
+            storage.save_store(cube, args.store, args.region)
+            written = len(cube)
+    if args.parquet is not None:
+        storage.export_parquet(cube, args.parquet)
+    yield {'file': get_data.raw_data_file(args.file), 'days': len(cube),
+           'first_day': cube.dates[0].date().isoformat() if cube.dates else '',
+           'last_day': cube.dates[-1].date().isoformat() if cube.dates else '',
+           'pollutants': len(cube.pollutants), 'sources': len(cube.sources),
+           'industries': len(cube.industries), 'days_stored': written}
+
+
+def run_aggregate(args: argparse.Namespace) -> Iterator[dict]:
+    """Yield the total emission of each pollutant, or of each pollutant by each source or
+    industry, from --start up to but not including --end. With --sum-pollutants, yield the
+    total of all the selected pollutants by each source or industry instead.
+    """
+    dataset = get_dataset(args)
+    period = get_data.Period("range", args.start, args.end)
+    pollutant_totals, source_totals, industry_totals = \
+        get_data.get_period_totals(dataset, [period])
+    pollutants = get_pollutants(args, dataset)
+    if args.by == 'pollutant':
+        for pollutant in pollutants:
+            yield {'pollutant': pollutant,
+                   'total': pollutant_totals[0, dataset.pollutant_index[pollutant]].item()}
+        return
+    names, totals = (dataset.sources, source_totals[0]) if args.by == 'source' \
+        else (dataset.industries, industry_totals[0])
+    rows = totals[[dataset.pollutant_index[pollutant] for pollutant in pollutants]]
+    if args.sum_pollutants:
+        for k, name in enumerate(names):
+            yield {args.by: name, 'total': rows[:, k].sum().item()}
+    else:
+        for p, pollutant in enumerate(pollutants):
+            for k, name in enumerate(names):
+                yield {'pollutant': pollutant, args.by: name, 'total': rows[p, k].item()}
+
+
+def run_compare(args: argparse.Namespace) -> Iterator[dict]:
+    """Yield the total emission of each source, industry or pollutant, or of each pollutant by
+    mobile sources, in the --baseline and --comparison periods, like the charts of
+    visualisation_functions, with the weighted decrease drawn in the pie charts. The rows of
+    mobile sources name their pollutant in the pollutant column.
+    """
+    dataset = get_dataset(args)
+    baseline, comparison = args.baseline, args.comparison
+    if args.by == 'source':
+        totals = get_data.get_total_per_source(dataset, baseline, comparison)
+        decreases = get_data.get_decrease_per_source(dataset, baseline, comparison)
+    elif args.by == 'industry':
+        totals = get_data.get_total_per_industry(dataset, baseline, comparison)
+        decreases = get_data.get_decrease_per_industry(dataset, baseline, comparison)
+    elif args.by == 'mobile':
+        totals = get_data.get_total_per_mobile_pollutant(dataset, baseline, comparison)
+        decreases = get_data.get_decrease_per_mobile_pollutant(dataset, baseline, comparison)
+    else:
+        pollutant_totals = get_data.compare_periods(dataset, baseline, comparison).pollutant_totals
+        totals = dict(zip(dataset.pollutants, pollutant_totals.T.tolist()))
+        decreases = None
+    column = 'pollutant' if args.by == 'mobile' else args.by
+    for name, (before, after) in totals.items():
+        row = {column: name, baseline.name: before, comparison.name: after,
+               'change': after - before}
+        if decreases is not None:
+            row['weighted_decrease'] = decreases[name]
+        yield row
+
+
+def run_regress(args: argparse.Namespace) -> Iterator[dict]:
+    """Yield the coefficients, coefficient of determination and root mean squared error of the
+    polynomial trend of the given --degree of every daily series of each selected pollutant,
+    or only of the total of each pollutant with --totals-only.
+    """
+    import trends
+    dataset = get_dataset(args)
+    for pollutant in get_pollutants(args, dataset):
+        fit = trends.fit_trends(dataset.select_pollutant(pollutant), args.degree)
+        for k, (_, name) in enumerate(fit.series):
+            if name != "Total" and args.totals_only:
+                continue
+            row = {'pollutant': pollutant, 'name': name, 'r_squared': fit.r_squared[k].item(),
+                   'rmse': fit.rmse[k].item()}
+            for power in range(fit.degree, -1, -1):
+                row[f'x^{power}'] = fit.coefficients[fit.degree - power, k].item()
+            yield row
+
+
+def run_render(args: argparse.Namespace) -> Iterator[dict]:
+    """Save each of the given charts, or every chart, to the --folder and yield the names of
+    the image files. The images are read from the tile cache of tiles.py when the same charts
+    were already rendered from the same data.
+    """
+    dataset = get_dataset(args)
+    os.makedirs(args.folder, exist_ok=True)
+    for chart in args.charts or tiles.chart_names:
+        file_name = os.path.join(args.folder, f"{chart}.{args.image_format}")
+        with open(file_name, 'wb') as file:
+            file.write(tiles.render_tile(chart, dataset, args.image_format))
+        yield {'chart': chart, 'file': file_name}
+
+
+def run_bench(args: argparse.Namespace) -> Iterator[dict]:
+    """Yield the measurements of benchmark.run_benchmarks. With --check-imports, also check
+    the import budgets and report the problems on the standard error.
+    """
+    import benchmark
+    yield from benchmark.run_benchmarks(args.days, args.regions, args.industries, args.repeat,
+                                        not args.no_xlsx)
+    if args.check_imports:
+        problems = benchmark.check_import_budget()
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        if problems:
+            raise SystemExit(1)
+
+
+def run_serve(args: argparse.Namespace) -> Iterator[dict]:
+    """Answer queries about the dataset over HTTP on the --host and --port until interrupted.
+    """
+    import asyncio
+    import server
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.file))
+    except KeyboardInterrupt:
+        pass
+    yield from ()
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """Return the parser of the command line arguments of the interface.
+    """
+    parser = argparse.ArgumentParser(description="Analyse the emissions before and during "
+                                                 "Covid.")
+    parser.add_argument('--file', default=get_data.file_path,
+                        help="the dataset file (default: %(default)s)")
+    parser.add_argument('--store', default=None,
+                        help="the folder of a dataset store to read from, or to write to with "
+                             "ingest")
+    parser.add_argument('--region', default='all', help="the region of the store to use")
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv',
+                        help="write the rows as csv or as one JSON object per line")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help="parse the dataset file into the cache")
+    ingest.add_argument('--append', action='store_true',
+                        help="only add the new days to the region of the store")
+    ingest.add_argument('--parquet', default=None,
+                        help="also export the dataset to this Parquet file")
+    ingest.set_defaults(run=run_ingest)
+
+    aggregate = subparsers.add_parser('aggregate', help="total emissions over a range of days")
+    aggregate.add_argument('--by', choices=['pollutant', 'source', 'industry'],
+                           default='source')
+    aggregate.add_argument('--pollutant', action='append',
+                           help="a pollutant to include, all of them by default")
+    aggregate.add_argument('--start', type=parse_day, default=datetime.min,
+                           help="the first day, in ISO format")
+    aggregate.add_argument('--end', type=parse_day, default=datetime.max,
+                           help="the day after the last day, in ISO format")
+    aggregate.add_argument('--sum-pollutants', action='store_true',
+                           help="add up the selected pollutants")
+    aggregate.set_defaults(run=run_aggregate)
+
+    compare = subparsers.add_parser('compare', help="totals in two periods")
+    compare.add_argument('--by', choices=['source', 'industry', 'pollutant', 'mobile'],
+                         default='source')
+    compare.add_argument('--baseline', type=parse_period, default=get_data.before_covid,
+                         help="a year, an ISO week such as 2020-W05 or a range start:end")
+    compare.add_argument('--comparison', type=parse_period, default=get_data.during_covid,
+                         help="a year, an ISO week such as 2020-W05 or a range start:end")
+    compare.set_defaults(run=run_compare)
+
+    regress = subparsers.add_parser('regress', help="polynomial trends of the daily series")
+    regress.add_argument('--pollutant', action='append',
+                         help="a pollutant to fit, all of them by default")
+    regress.add_argument('--degree', type=int, default=1)
+    regress.add_argument('--totals-only', action='store_true',
+                         help="only fit the total of each pollutant")
+    regress.set_defaults(run=run_regress)
+
+    render = subparsers.add_parser('render', help="save the charts to image files")
+    render.add_argument('charts', nargs='*', type=parse_chart,
+                        help="the charts to save, all of them by default")
+    render.add_argument('--folder', default='charts')
+    render.add_argument('--image-format', default='png')
+    render.set_defaults(run=run_render)
+
+    bench = subparsers.add_parser('bench', help="run the benchmarks")
+    bench.add_argument('--days', type=int, default=730)
+    bench.add_argument('--regions', type=int, default=1)
+    bench.add_argument('--industries', type=int, default=5)
+    bench.add_argument('--repeat', type=int, default=3)
+    bench.add_argument('--no-xlsx', action='store_true')
+    bench.add_argument('--check-imports', action='store_true')
+    bench.set_defaults(run=run_bench)
+
+    serve = subparsers.add_parser('serve', help="answer queries over HTTP")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8000)
+    serve.set_defaults(run=run_serve)
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the subcommand given by the command line arguments argv, or by sys.argv if argv is
+    None, and return the exit status.
+    """
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    try:
+        write_rows(args.run(args), args.format)
+    except argparse.ArgumentTypeError as error:
+        parser.error(str(error))
+    except BrokenPipeError:
+        sys.stderr.close()
+    return 0
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ["argparse", "csv", "json", "os", "sys", "datetime", "typing",
+                          "get_data", "storage", "trends", "charts", "benchmark", "asyncio",
+                          "server", "tiles"],
+        'allowed-io': ["run_bench", "write_rows", "run_render"],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200', 'C0415']
+    })
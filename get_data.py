@@ -1,7 +1,7 @@
 """CSC110 Fall 2020 Project Final Submission
 ===============================
 
-This Python module contains three dataclass definitions and several functions to read
+This Python module contains several dataclass definitions and several functions to read
 and organize the dataset, hence presenting the foundation of our computational model
 that analyses the effects of COVID19 on emissions of pollutant gases by sources and
 it's respective industries.
@@ -20,20 +20,130 @@ expressly prohibited.
 
 This file is Copyright (c) 2020 Ipek Akyol, Yumna Refai, Helia Sajjadian Moosavi .
 """
-from dataclasses import dataclass
-from datetime import datetime
+from __future__ import annotations
 
-import openpyxl
-import pandas as pd
-import python_ta
+import bisect
+import copy
+import csv
+import functools
+import hashlib
+import itertools
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Optional
+
+import numpy as np
+
+import instrumentation
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 file_path = r'data.xlsx'
+csv_path = r'data.csv'
 
 main_sources = ["Power plants", "Heavy industry",
                 "Light industry", "Mobile sources", "Other sources"]
 
+memo_size = 256
 
-@dataclass
+_cube_versions = itertools.count()
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+class KeyTable:
+    """
+    An ordered table of interned names, shared by all the mappings with these names as keys.
+
+    Instance Attributes:
+        - names: the names in the table
+        - index: maps each name to its position in self.names
+        - positions: the position in the underlying array of the value for each name
+
+    Representation Invariants:
+        - len(self.names) == len(self.positions)
+
+    Sample Usage:
+    >>> table = KeyTable(["Marine", "Aviation aircraft"])
+    >>> table.index["Aviation aircraft"]
+    1
+    """
+    __slots__ = ('names', 'index', 'positions')
+    names: tuple[str, ...]
+    index: dict[str, int]
+    positions: np.ndarray
+
+    def __init__(self, names: list[str], positions: Optional[np.ndarray] = None) -> None:
+        self.names = tuple(sys.intern(name) for name in names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        if positions is None:
+            positions = np.arange(len(self.names))
+        self.positions = positions
+
+
+class ArrayMapping(Mapping):
+    """
+    A read-only dictionary from the names of a key table to floats stored in an array.
+
+    Sample Usage:
+    >>> marine = ArrayMapping(KeyTable(["Marine"], np.array([1])), np.array([11.0, 78.0]))
+    >>> marine["Marine"]
+    78.0
+    >>> marine == {"Marine": 78.0}
+    True
+    """
+    __slots__ = ('_keys', '_values')
+
+    def __init__(self, keys: KeyTable, values: np.ndarray) -> None:
+        self._keys = keys
+        self._values = values
+
+    def __getitem__(self, key: str) -> float:
+        return float(self._values[self._keys.positions[self._keys.index[key]]])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys.names)
+
+    def __len__(self) -> int:
+        return len(self._keys.names)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class RecordMapping(Mapping):
+    """
+    A read-only dictionary from the names of a key table to records that are built by a
+    function from the position of the name in the table when they are looked up.
+    """
+    __slots__ = ('_keys', '_build')
+
+    def __init__(self, keys: KeyTable, build: Callable[[int], Any]) -> None:
+        self._keys = keys
+        self._build = build
+
+    def __getitem__(self, key: str) -> Any:
+        return self._build(self._keys.index[key])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys.names)
+
+    def __len__(self) -> int:
+        return len(self._keys.names)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+@dataclass(frozen=True, slots=True)
 class Source:
     """
     A source of emission.
@@ -56,14 +166,16 @@ class Source:
     >>> mobile_source = Source("Mobile sources",89.0,{"Marine":78.0,"Aviation aircraft":11.0})
     >>> mobile_source.name == "Mobile sources"
     True
+    >>> import pickle
+    >>> pickle.loads(pickle.dumps(mobile_source)) == mobile_source
+    True
     """
-
     name: str
     total: float
-    industries: dict[str, float]
+    industries: Mapping[str, float]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Pollutant:
     """
     A pollutant gas.
@@ -87,10 +199,10 @@ class Pollutant:
     """
     name: str
     total: float
-    sources: dict[str, Source]
+    sources: Mapping[str, Source]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Day:
     """
     A day.
@@ -115,178 +227,867 @@ class Day:
     """
     date: datetime
     total: float
-    pollutants: [str, Pollutant]
-
-
-def with_openpyxl(file_name: str = file_path) -> list:
-    """Return a list of lists corresponding to the excel table in the file with the file_name.
-    """
-    wb = openpyxl.load_workbook(file_name, data_only=True)
-    sheet = wb.active
-    columns = sheet.columns
-    data = []
-    for column in columns:
-        record = []
-        for cell in column:
-            record.append(cell.value)
-        data.append(record)
-    return data
-
-
-def get_organized_data(data: list) -> list[Day]:
-    """Return the list of the objects with the type Day which
-    summarises the whole dataset in the data list.
-    """
-    source = Source("", 0.0, {})
-    sources = {}
-    pollutants = {}
-    organized_data = []
-    for info in data[5:]:
-        for i in range(2, len(data[0])):
-            if data[2][i] == "kton":
-                scale = 1000
-            else:
-                scale = 1
-            if data[0][i] in main_sources + ["Total"]:
-                if source.name != "":
-                    sources[source.name] = source
-                source = Source(data[0][i], info[i] * scale, {})
-                if data[0][i] == "Total":
-                    pollutant = Pollutant(data[1][i], info[i] * scale, sources)
-                    pollutants[pollutant.name] = pollutant
-                    sources = {}
-            else:
-                source.industries[data[0][i]] = info[i] * scale
-        t = sum([pollutants[pollutant].total for pollutant in pollutants])
-        day = Day(info[1], t, pollutants)
-        organized_data.append(day)
-        pollutants = {}
-    return organized_data
-
-
-def get_data_for_linear_regression(dataset: list[Day], pollutant: str) -> pd.DataFrame:
+    pollutants: Mapping[str, Pollutant]
+
+
+@dataclass(eq=False)
+class EmissionsCube:
+    """
+    The whole dataset stored as dense arrays indexed by day, pollutant, source and industry.
+    Day, Pollutant and Source objects are only built when a day of the cube is accessed, and
+    their dictionaries read the arrays of the cube through key tables shared by all days.
+    The arrays may be memory-mapped from a dataset store on disk (see storage.open_store).
+    Cubes are compared by identity, since comparing their arrays with == is ambiguous.
+
+    Instance Attributes:
+        - dates: the date of each day in the dataset
+        - pollutants: the names of the pollutant gases
+        - sources: the names of the main sources of emission
+        - industries: the names of all industries of all sources
+        - industry_sources: the index in self.sources of the source of each industry
+        - pollutant_totals: the total emission of each pollutant on each day,
+        with shape (days, pollutants)
+        - source_totals: the total emission of each pollutant by each source on each day,
+        with shape (days, pollutants, sources)
+        - industry_totals: the emission of each pollutant by each industry on each day,
+        with shape (days, pollutants, industries)
+        - pollutant_index: maps each pollutant name to its position in self.pollutants
+        - source_index: maps each source name to its position in self.sources
+        - industry_index: maps each industry name to its position in self.industries
+        - running: the running totals of the cube (see EmissionsCube.running_totals), or None
+        if they have not been computed yet
+        - version: a number that identifies this cube among all cubes created in the process,
+        used to memoize the results computed from it
+
+    Representation Invariants:
+        - self.pollutant_totals.shape == (len(self.dates), len(self.pollutants))
+        - self.source_totals.shape == (len(self.dates), len(self.pollutants), len(self.sources))
+        - self.industry_totals.shape == \
+        (len(self.dates), len(self.pollutants), len(self.industries))
+        - len(self.industry_sources) == len(self.industries)
+
+    Sample Usage:
+    >>> cube = EmissionsCube([datetime(2019, 1, 1)], ["SO2"], ["Mobile sources"],
+    ...                      ["Marine", "Aviation aircraft"], np.array([0, 0]),
+    ...                      np.array([[89.0]]), np.array([[[89.0]]]),
+    ...                      np.array([[[78.0, 11.0]]]))
+    >>> cube[0].pollutants["SO2"].sources["Mobile sources"].industries["Marine"]
+    78.0
+    """
+    dates: list[datetime]
+    pollutants: list[str]
+    sources: list[str]
+    industries: list[str]
+    industry_sources: np.ndarray
+    pollutant_totals: np.ndarray
+    source_totals: np.ndarray
+    industry_totals: np.ndarray
+    pollutant_index: dict[str, int] = field(init=False, repr=False)
+    source_index: dict[str, int] = field(init=False, repr=False)
+    industry_index: dict[str, int] = field(init=False, repr=False)
+    running: Optional[tuple[np.ndarray, np.ndarray, np.ndarray]] = \
+        field(default=None, repr=False)
+    version: int = field(init=False, repr=False, compare=False,
+                         default_factory=lambda: next(_cube_versions))
+    _pollutant_keys: KeyTable = field(init=False, repr=False, compare=False)
+    _source_keys: KeyTable = field(init=False, repr=False, compare=False)
+    _industry_keys: list[KeyTable] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.pollutant_index = {name: i for i, name in enumerate(self.pollutants)}
+        self.source_index = {name: i for i, name in enumerate(self.sources)}
+        self.industry_index = {name: i for i, name in enumerate(self.industries)}
+        self._pollutant_keys = KeyTable(self.pollutants)
+        self._source_keys = KeyTable(self.sources)
+        self._industry_keys = []
+        for s in range(len(self.sources)):
+            positions = np.flatnonzero(self.industry_sources == s)
+            self._industry_keys.append(KeyTable([self.industries[i] for i in positions],
+                                                positions))
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __getitem__(self, index: int) -> Day:
+        return self.day(index)
+
+    def __iter__(self) -> Iterator[Day]:
+        for i in range(len(self.dates)):
+            yield self.day(i)
+
+    def day(self, index: int) -> Day:
+        """Return the Day object for the day at the given index of the cube.
+        """
+        return Day(self.dates[index], float(self.pollutant_totals[index].sum()),
+                   RecordMapping(self._pollutant_keys, functools.partial(self._pollutant, index)))
+
+    def _pollutant(self, index: int, p: int) -> Pollutant:
+        """Return the Pollutant object for the pollutant at position p on the day at the
+        given index of the cube.
+        """
+        return Pollutant(self.pollutants[p], float(self.pollutant_totals[index, p]),
+                         RecordMapping(self._source_keys,
+                                       functools.partial(self._source, index, p)))
+
+    def _source(self, index: int, p: int, s: int) -> Source:
+        """Return the Source object for the source at position s and the pollutant at
+        position p on the day at the given index of the cube.
+        """
+        return Source(self.sources[s], float(self.source_totals[index, p, s]),
+                      ArrayMapping(self._industry_keys[s], self.industry_totals[index, p]))
+
+    def years(self) -> np.ndarray:
+        """Return an array with the year of each day in the cube.
+        """
+        return np.array([date.year for date in self.dates])
+
+    def running_totals(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the running totals over the days of self.pollutant_totals, self.source_totals
+        and self.industry_totals.
+
+        Each array starts with a row of zeros, so the total of the days from index a up to but
+        not including index b is running[b] - running[a]. The running totals are computed the
+        first time they are needed and then kept with the cube in self.running.
+        """
+        if self.running is None:
+            self.running = (_running_total(self.pollutant_totals),
+                            _running_total(self.source_totals),
+                            _running_total(self.industry_totals))
+        return self.running
+
+    def between(self, start: datetime, end: datetime) -> EmissionsCube:
+        """Return the part of the cube with the days from start up to but not including end.
+
+        The arrays of the returned cube are views of the arrays of this cube, so no data is
+        copied, even when the arrays are memory-mapped from disk.
+
+        Preconditions:
+            - self.dates == sorted(self.dates)
+        """
+        a = bisect.bisect_left(self.dates, start)
+        b = bisect.bisect_left(self.dates, end)
+        return EmissionsCube(self.dates[a:b], self.pollutants, self.sources, self.industries,
+                             self.industry_sources, self.pollutant_totals[a:b],
+                             self.source_totals[a:b], self.industry_totals[a:b])
+
+    def select_pollutant(self, pollutant: str) -> EmissionsCube:
+        """Return the part of the cube with only the given pollutant.
+
+        The arrays of the returned cube are views of the arrays of this cube.
+
+        Preconditions:
+            - pollutant in self.pollutant_index
+        """
+        p = slice(self.pollutant_index[pollutant], self.pollutant_index[pollutant] + 1)
+        return EmissionsCube(self.dates, [pollutant], self.sources, self.industries,
+                             self.industry_sources, self.pollutant_totals[:, p],
+                             self.source_totals[:, p], self.industry_totals[:, p])
+
+
+def _running_total(values: np.ndarray) -> np.ndarray:
+    """Return the running total of the values along the first axis, starting with zeros.
+    """
+    running = np.zeros((values.shape[0] + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=running[1:])
+    return running
+
+
+@dataclass(frozen=True)
+class Period:
+    """
+    A period of days to compare emissions over.
+
+    Instance Attributes:
+        - name: the name of the period, used as a label in charts
+        - start: the first day of the period
+        - end: the day after the last day of the period
+
+    Representation Invariants:
+        - self.start <= self.end
+
+    Sample Usage:
+    >>> lockdown = Period("Lockdown", datetime(2020, 1, 23), datetime(2020, 4, 8))
+    >>> lockdown.start < datetime(2020, 2, 1) < lockdown.end
+    True
+    """
+    name: str
+    start: datetime
+    end: datetime
+
+
+def year_period(year: int) -> Period:
+    """Return the period of all the days of the given year.
+    """
+    return Period(str(year), datetime(year, 1, 1), datetime(year + 1, 1, 1))
+
+
+def iso_week_period(year: int, week: int) -> Period:
+    """Return the period of the days of the given ISO week of the given ISO year.
+    """
+    start = datetime.fromisocalendar(year, week, 1)
+    return Period(f"{year}-W{week:02d}", start, start + timedelta(days=7))
+
+
+def parse_period(text: str) -> Period:
+    """Return the period described by the text: a year such as 2019, an ISO week such as
+    2020-W05, or a range of days start:end such as 2020-01-23:2020-04-08, which includes start
+    but not end. Either side of a range can be left out to leave it open.
+
+    Raise ValueError if the text does not describe a period.
+
+    >>> parse_period("2020-W05").start
+    datetime.datetime(2020, 1, 27, 0, 0)
+    >>> parse_period("2020-03-01:").end == datetime.max
+    True
+    """
+    try:
+        if ':' in text:
+            start, end = text.split(':', 1)
+            return Period(text, datetime.fromisoformat(start) if start else datetime.min,
+                          datetime.fromisoformat(end) if end else datetime.max)
+        elif '-W' in text:
+            year, week = text.split('-W')
+            return iso_week_period(int(year), int(week))
+        else:
+            return year_period(int(text))
+    except ValueError:
+        raise ValueError(f"invalid period: {text!r}")
+
+
+before_covid = year_period(2019)
+during_covid = Period("2020", datetime(2020, 1, 1), datetime.max)
+
+
+@dataclass
+class Comparison:
+    """
+    The emissions of a baseline period and of a comparison period.
+
+    Instance Attributes:
+        - baseline: the period that is compared against
+        - comparison: the period that is compared to the baseline
+        - pollutant_totals: the total emission of each pollutant in the baseline and in the
+        comparison period, with shape (2, pollutants)
+        - source_totals: the total emission of each pollutant by each source in the baseline
+        and in the comparison period, with shape (2, pollutants, sources)
+        - industry_totals: the total emission of each pollutant by each industry in the
+        baseline and in the comparison period, with shape (2, pollutants, industries)
+    """
+    baseline: Period
+    comparison: Period
+    pollutant_totals: np.ndarray
+    source_totals: np.ndarray
+    industry_totals: np.ndarray
+
+    def pollutant_deltas(self) -> np.ndarray:
+        """Return the change of the total emission of each pollutant.
+        """
+        return self.pollutant_totals[1] - self.pollutant_totals[0]
+
+    def source_deltas(self) -> np.ndarray:
+        """Return the change of the emission of each pollutant by each source.
+        """
+        return self.source_totals[1] - self.source_totals[0]
+
+    def industry_deltas(self) -> np.ndarray:
+        """Return the change of the emission of each pollutant by each industry.
+        """
+        return self.industry_totals[1] - self.industry_totals[0]
+
+
+@dataclass
+class RawData:
+    """
+    The table of a dataset file, with one series of emissions for each row of the file.
+
+    Instance Attributes:
+        - sources: the name of the source or industry of each series
+        - pollutants: the name of the pollutant of each series
+        - units: the unit of each series
+        - dates: the date of each day in the file
+        - values: the value of each series on each day, with shape (days, series)
+
+    Representation Invariants:
+        - len(self.sources) == len(self.pollutants) == len(self.units)
+        - self.values.shape == (len(self.dates), len(self.sources))
+        - all(unit in {"ton", "kton"} for unit in self.units)
+    """
+    sources: list[str]
+    pollutants: list[str]
+    units: list[str]
+    dates: list[datetime]
+    values: np.ndarray
+
+
+@instrumentation.timed
+def with_openpyxl(file_name: str = file_path) -> RawData:
+    """Return the RawData corresponding to the excel table in the file with the file_name.
+
+    The workbook is read row by row in read-only mode, so no cell objects are kept in memory.
+    The first row of the table is the header, the second row contains the dates and each of
+    the following rows contains one series.
+    """
+    import openpyxl
+    wb = openpyxl.load_workbook(file_name, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        next(rows)
+        dates = list(next(rows)[5:])
+        sources, pollutants, units, series = [], [], [], []
+        for row in rows:
+            sources.append(row[0])
+            pollutants.append(row[1])
+            units.append(row[2])
+            series.append(np.array(row[5:], dtype=float))
+    finally:
+        wb.close()
+    instrumentation.count("series", len(series))
+    instrumentation.count("cells", len(series) * len(dates))
+    return RawData(sources, pollutants, units, dates, np.stack(series, axis=1))
+
+
+@instrumentation.timed
+def with_csv(file_name: str = csv_path) -> RawData:
+    """Return the RawData corresponding to the csv table in the file with the file_name.
+
+    The csv file has one row for each series, starting with an index column followed by the
+    Sources, Pollutants, Units, 2019 base and 2020 base columns and one column for each date.
+    Rows without a source, such as the row of lockdown phase notes, are skipped. All the
+    values are parsed at once by numpy.
+    """
+    with open(file_name, newline='') as file:
+        lines = file.read().splitlines()
+    header = next(csv.reader(lines[:1]))
+    rows = [(line, row[1:4]) for line, row in zip(lines[1:], csv.reader(lines[1:])) if row[1]]
+    labels = [label for _, label in rows]
+    values = np.loadtxt([line for line, _ in rows], delimiter=',', quotechar='"',
+                        usecols=range(6, len(header)), ndmin=2)
+    instrumentation.count("series", values.shape[0])
+    instrumentation.count("cells", values.size)
+    return RawData([label[0] for label in labels], [label[1] for label in labels],
+                   [label[2] for label in labels],
+                   [datetime.fromisoformat(date) for date in header[6:]],
+                   np.ascontiguousarray(values.T))
+
+
+@instrumentation.timed
+def load_raw_data(file_name: str = file_path) -> RawData:
+    """Return the RawData of the dataset in the file with the file_name using the fastest
+    available reader.
+
+    A csv file is read directly. For an excel file, the csv file with the same name in the same
+    folder is read instead when raw_data_file finds that it still contains the same table,
+    since it is much faster to parse than the workbook.
+    """
+    source_name = raw_data_file(file_name)
+    if source_name.endswith('.csv'):
+        return with_csv(source_name)
+    else:
+        return with_openpyxl(source_name)
+
+
+def get_file_key(file_name: str) -> dict:
+    """Return a dictionary that identifies the current contents of the file with the file_name,
+    made of its size, its modification time and the sha256 hash of its contents.
+    """
+    stat = os.stat(file_name)
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+
+
+def is_unchanged(file_name: str, key: dict) -> bool:
+    """Return whether the file with the file_name still has the contents identified by the key
+    returned by get_file_key. A file with the same size and modification time is assumed to be
+    unchanged, and otherwise the hashes of the contents are compared.
+    """
+    stat = os.stat(file_name)
+    if (stat.st_size, stat.st_mtime_ns) == (key['size'], key['mtime_ns']):
+        return True
+    return get_file_key(file_name)['sha256'] == key['sha256']
+
+
+def raw_data_file(file_name: str = file_path, folder: str = r'.cache') -> str:
+    """Return the name of the file that load_raw_data reads for the dataset in the file
+    with the file_name: the csv file with the same name, unless the file was changed since the
+    csv file was first read in its place, or else the file itself.
+
+    The first time the csv file is read in place of the file, the keys of both files are
+    recorded in the folder. The file is read again instead only when its contents no longer
+    match the record, and the csv file is trusted again once its own contents change. The
+    contents are compared rather than the modification times, which only reflect the order in
+    which the files were checked out.
+    """
+    csv_name = os.path.splitext(file_name)[0] + '.csv'
+    if csv_name == file_name or not os.path.exists(csv_name):
+        return file_name
+    elif not os.path.exists(file_name):
+        return csv_name
+    record_name = os.path.join(os.path.dirname(csv_name), folder,
+                               os.path.basename(csv_name) + '.source.json')
+    try:
+        with open(record_name) as file:
+            record = json.load(file)
+        csv_key, file_key = record['csv'], record['file']
+    except (OSError, ValueError, KeyError, TypeError):
+        csv_key = file_key = None
+
+    if csv_key is not None and is_unchanged(csv_name, csv_key):
+        return csv_name if is_unchanged(file_name, file_key) else file_name
+    os.makedirs(os.path.dirname(record_name), exist_ok=True)
+    with open(record_name + '.tmp', 'w') as file:
+        json.dump({'csv': get_file_key(csv_name), 'file': get_file_key(file_name)}, file)
+    os.replace(record_name + '.tmp', record_name)
+    return csv_name
+
+
+@dataclass
+class Schema:
+    """
+    The layout of the series of a data table, compiled once from its three header columns.
+
+    Instance Attributes:
+        - pollutants: the names of the pollutant gases, in the order of their Total series
+        - industries: the names of all industries of all sources
+        - industry_sources: the index in main_sources of the source of each industry
+        - roles: the role of each series, which is "total" for the total of a pollutant,
+        "source" for the total of a source and "industry" for an industry
+        - series_pollutants: the index in self.pollutants of the pollutant of each series
+        - series_targets: the index in main_sources of the source of each "source" series,
+        the index in self.industries of the industry of each "industry" series and 0 for
+        each "total" series
+        - scales: the factor that converts each series to tons
+
+    Representation Invariants:
+        - all(role in {"total", "source", "industry"} for role in self.roles)
+        - len(self.roles) == len(self.series_pollutants) == len(self.series_targets) \
+        == len(self.scales)
+    """
+    pollutants: list[str]
+    industries: list[str]
+    industry_sources: np.ndarray
+    roles: list[str]
+    series_pollutants: np.ndarray
+    series_targets: np.ndarray
+    scales: np.ndarray
+
+    def series_with_role(self, role: str) -> np.ndarray:
+        """Return the indices of the series with the given role.
+        """
+        return np.array([i for i in range(len(self.roles)) if self.roles[i] == role],
+                        dtype=np.intp)
+
+
+def get_schema(data: RawData) -> Schema:
+    """Return the Schema of the series of the data table.
+    """
+    pollutant_names = [data.pollutants[i] for i in range(len(data.sources))
+                       if data.sources[i] == "Total"]
+    pollutant_index = {name: p for p, name in enumerate(pollutant_names)}
+    industry_index = {}
+    industry_sources = []
+    roles = []
+    targets = []
+    source = ""
+    for name in data.sources:
+        if name == "Total":
+            roles.append("total")
+            targets.append(0)
+        elif name in main_sources:
+            source = name
+            roles.append("source")
+            targets.append(main_sources.index(name))
+        else:
+            if name not in industry_index:
+                industry_index[name] = len(industry_index)
+                industry_sources.append(main_sources.index(source))
+            roles.append("industry")
+            targets.append(industry_index[name])
+    return Schema(pollutant_names, list(industry_index), np.array(industry_sources, dtype=np.intp),
+                  roles, np.array([pollutant_index[name] for name in data.pollutants],
+                                  dtype=np.intp),
+                  np.array(targets, dtype=np.intp),
+                  np.array([1000.0 if unit == "kton" else 1.0 for unit in data.units]))
+
+
+@instrumentation.timed
+def get_organized_data(data: RawData, schema: Optional[Schema] = None) -> EmissionsCube:
+    """Return an EmissionsCube which summarises the whole dataset in the data table.
+    Iterating over the cube gives the objects with the type Day for each day of the dataset.
+
+    The values of all days are scaled to tons and scattered into the cube at once, following
+    the schema of the data table, which is compiled from the table when it is not given.
+    """
+    if schema is None:
+        schema = get_schema(data)
+    days = len(data.dates)
+    cube = EmissionsCube(list(data.dates), schema.pollutants, list(main_sources),
+                         schema.industries, schema.industry_sources,
+                         np.zeros((days, len(schema.pollutants))),
+                         np.zeros((days, len(schema.pollutants), len(main_sources))),
+                         np.zeros((days, len(schema.pollutants), len(schema.industries))))
+    values = data.values * schema.scales
+    totals = schema.series_with_role("total")
+    cube.pollutant_totals[:, schema.series_pollutants[totals]] = values[:, totals]
+    sources = schema.series_with_role("source")
+    cube.source_totals[:, schema.series_pollutants[sources],
+                       schema.series_targets[sources]] = values[:, sources]
+    industries = schema.series_with_role("industry")
+    cube.industry_totals[:, schema.series_pollutants[industries],
+                         schema.series_targets[industries]] = values[:, industries]
+    instrumentation.count("days organized", days)
+    instrumentation.count("cells organized", values.size)
+    return cube
+
+
+@instrumentation.timed
+def get_organized_data_parallel(data: RawData, shard_by: str = "pollutant",
+                                processes: Optional[int] = None) -> EmissionsCube:
+    """Return the same EmissionsCube as get_organized_data(data), organizing shards of the
+    data table in a pool of processes.
+
+    If shard_by is "pollutant", each shard holds the series of one pollutant. If shard_by is
+    "date", the days are split into one shard for each process. This pays off on multi-year
+    tables, where organizing the data takes longer than sending it to the processes.
+
+    The schema is compiled once from the whole table, and every shard is organized against
+    its lists of pollutants and industries, so the shards line up even when some pollutants
+    are not emitted by every industry.
+
+    Preconditions:
+        - shard_by in {"pollutant", "date"}
+        - processes is None or processes >= 1
+
+    >>> data = RawData(["Mobile sources", "Marine", "Total", "Mobile sources", "Marine",
+    ...                 "Aviation aircraft", "Total"], ["SO2"] * 3 + ["NOx"] * 4, ["ton"] * 7,
+    ...                [datetime(2019, 1, 1), datetime(2019, 1, 2)],
+    ...                np.array([[5.0, 5.0, 5.0, 9.0, 7.0, 2.0, 9.0],
+    ...                          [4.0, 4.0, 4.0, 8.0, 5.0, 3.0, 8.0]]))
+    >>> serial = get_organized_data(data)
+    >>> for shard_by in ["pollutant", "date"]:
+    ...     cube = get_organized_data_parallel(data, shard_by, 2)
+    ...     print(cube.industries == serial.industries and all(
+    ...         np.array_equal(getattr(cube, name), getattr(serial, name))
+    ...         for name in ["pollutant_totals", "source_totals", "industry_totals"]))
+    True
+    True
+    """
+    schema = get_schema(data)
+    if shard_by == "pollutant":
+        shards, schemas = [], []
+        for p, pollutant in enumerate(schema.pollutants):
+            rows = np.flatnonzero(schema.series_pollutants == p)
+            shards.append(RawData([data.sources[i] for i in rows], [pollutant] * len(rows),
+                                  [data.units[i] for i in rows], data.dates,
+                                  np.ascontiguousarray(data.values[:, rows])))
+            schemas.append(Schema([pollutant], schema.industries, schema.industry_sources,
+                                  [schema.roles[i] for i in rows],
+                                  np.zeros(len(rows), dtype=np.intp),
+                                  schema.series_targets[rows], schema.scales[rows]))
+    else:
+        count = processes or os.cpu_count() or 1
+        bounds = np.linspace(0, len(data.dates), count + 1).astype(int)
+        shards = [RawData(data.sources, data.pollutants, data.units,
+                          data.dates[bounds[k]:bounds[k + 1]],
+                          data.values[bounds[k]:bounds[k + 1]])
+                  for k in range(count) if bounds[k] < bounds[k + 1]]
+        schemas = [schema] * len(shards)
+
+    with ProcessPoolExecutor(processes) as executor:
+        cubes = list(executor.map(get_organized_data, shards, schemas))
+
+    if shard_by == "pollutant":
+        return _merge_cubes(cubes, cubes[0].dates, schema.pollutants, axis=1)
+    else:
+        return _merge_cubes(cubes, [date for cube in cubes for date in cube.dates],
+                            schema.pollutants, axis=0)
+
+
+def _merge_cubes(cubes: list[EmissionsCube], dates: list[datetime], pollutants: list[str],
+                 axis: int) -> EmissionsCube:
+    """Return the cube made of the arrays of the cubes joined along the given axis, which is
+    0 for cubes of consecutive days and 1 for cubes of different pollutants.
+    """
+    return EmissionsCube(dates, pollutants, cubes[0].sources, cubes[0].industries,
+                         cubes[0].industry_sources,
+                         np.concatenate([cube.pollutant_totals for cube in cubes], axis=axis),
+                         np.concatenate([cube.source_totals for cube in cubes], axis=axis),
+                         np.concatenate([cube.industry_totals for cube in cubes], axis=axis))
+
+
+def append_days(dataset: EmissionsCube, new_days: EmissionsCube) -> EmissionsCube:
+    """Return a cube with the days of the dataset followed by the days of new_days.
+
+    The running totals of the new days are continued from the last running totals of the
+    dataset, so the history of the dataset is not summed again.
+
+    Preconditions:
+        - new_days.pollutants == dataset.pollutants
+        - new_days.sources == dataset.sources
+        - new_days.industries == dataset.industries
+    """
+    if dataset.dates and new_days.dates and new_days.dates[0] <= dataset.dates[-1]:
+        raise ValueError(f"new days must start after {dataset.dates[-1]}")
+    running = tuple(np.concatenate([old, old[-1] + np.cumsum(values, axis=0)])
+                    for old, values in zip(dataset.running_totals(),
+                                           (new_days.pollutant_totals, new_days.source_totals,
+                                            new_days.industry_totals)))
+    return EmissionsCube(dataset.dates + new_days.dates, dataset.pollutants, dataset.sources,
+                         dataset.industries, dataset.industry_sources,
+                         np.concatenate([dataset.pollutant_totals, new_days.pollutant_totals]),
+                         np.concatenate([dataset.source_totals, new_days.source_totals]),
+                         np.concatenate([dataset.industry_totals, new_days.industry_totals]),
+                         running=running)
+
+
+def memoized(function: Callable) -> Callable:
+    """Return the function, whose first argument is a dataset, wrapped so that its results are
+    kept and reused for the same dataset version and the same other arguments.
+
+    At most memo_size results are kept for all memoized functions together, and the least
+    recently used result is dropped first. Each call returns a copy of the kept result, so
+    callers may change it.
+    """
+    @functools.wraps(function)
+    def wrapper(dataset: EmissionsCube, *args: Any, **kwargs: Any) -> Any:
+        key = (function.__qualname__, dataset.version, args, tuple(sorted(kwargs.items())))
+        with _memo_lock:
+            if key in _memo:
+                _memo.move_to_end(key)
+                return copy.copy(_memo[key])
+        result = function(dataset, *args, **kwargs)
+        with _memo_lock:
+            _memo[key] = result
+            while len(_memo) > memo_size:
+                _memo.popitem(last=False)
+        return copy.copy(result)
+    return wrapper
+
+
+def clear_memo(dataset: Optional[EmissionsCube] = None) -> None:
+    """Drop the memoized results computed from the dataset, or all of them if dataset is None.
+    """
+    with _memo_lock:
+        if dataset is None:
+            _memo.clear()
+        else:
+            for key in [key for key in _memo if key[1] == dataset.version]:
+                del _memo[key]
+
+
+@instrumentation.timed
+@memoized
+def get_data_for_linear_regression(dataset: EmissionsCube, pollutant: str) -> pd.DataFrame:
     """ Return a pandas Data Frame that contains the value of
     the given pollutants total emission in each day.
     """
+    import pandas as pd
     first_day = datetime(2019, 1, 1)
-    data = {"day": [], "total": []}
-    for day in dataset:
-        data["day"].append((day.date - first_day).days)
-        data["total"].append(day.pollutants[pollutant].total)
+    data = {"day": [(date - first_day).days for date in dataset.dates],
+            "total": dataset.pollutant_totals[:, dataset.pollutant_index[pollutant]]}
     return pd.DataFrame.from_dict(data)
 
 
-def get_total_per_source(dataset: list[Day]) -> dict[str, tuple[float, float]]:
+def get_period_totals(dataset: EmissionsCube, periods: list[Period]) \
+        -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the total emission of each pollutant, of each pollutant by each source and of
+    each pollutant by each industry during each of the periods.
+
+    The arrays have the shapes (periods, pollutants), (periods, pollutants, sources) and
+    (periods, pollutants, industries). Every total is the difference of two running totals
+    of the dataset, so its cost does not depend on the length of the period.
+    """
+    starts = [bisect.bisect_left(dataset.dates, period.start) for period in periods]
+    ends = [bisect.bisect_left(dataset.dates, period.end) for period in periods]
+    pollutants, sources, industries = dataset.running_totals()
+    return (pollutants[ends] - pollutants[starts], sources[ends] - sources[starts],
+            industries[ends] - industries[starts])
+
+
+def compare_periods(dataset: EmissionsCube, baseline: Period = before_covid,
+                    comparison: Period = during_covid) -> Comparison:
+    """Return the Comparison of the emissions in the dataset during the baseline period and
+    during the comparison period.
+    """
+    return Comparison(baseline, comparison,
+                      *get_period_totals(dataset, [baseline, comparison]))
+
+
+def get_range_total(dataset: EmissionsCube, pollutant: str, name: str,
+                    start: datetime, end: datetime) -> float:
+    """Return the total emission of the pollutant by the source or industry with the given
+    name from the day start up to but not including the day end. If the name is "Total",
+    return the total emission of the pollutant.
+
+    The total is read from the running totals of the dataset, so it takes constant time.
+
+    Preconditions:
+        - pollutant in dataset.pollutant_index
+        - name == "Total" or name in dataset.source_index or name in dataset.industry_index
+    """
+    a = bisect.bisect_left(dataset.dates, start)
+    b = bisect.bisect_left(dataset.dates, end)
+    p = dataset.pollutant_index[pollutant]
+    pollutants, sources, industries = dataset.running_totals()
+    if name == "Total":
+        return (pollutants[b, p] - pollutants[a, p]).item()
+    elif name in dataset.source_index:
+        s = dataset.source_index[name]
+        return (sources[b, p, s] - sources[a, p, s]).item()
+    else:
+        i = dataset.industry_index[name]
+        return (industries[b, p, i] - industries[a, p, i]).item()
+
+
+@instrumentation.timed
+@memoized
+def get_total_per_source(dataset: EmissionsCube, baseline: Period = before_covid,
+                         comparison: Period = during_covid) -> dict[str, tuple[float, float]]:
     """ Return a dictionary that maps each source of emission to the corresponding
-    value of the total pollutants emission for that source in 2019 (before Covid)
-    and 2020 (during Covid).
-    """
-    data = {}
-    for source in main_sources:
-        total_2019 = 0
-        total_2020 = 0
-        for day in dataset:
-            if day.date.year == 2019:
-                for p in day.pollutants.values():
-                    total_2019 += p.sources[source].total
-            else:
-                for p in day.pollutants.values():
-                    total_2020 += p.sources[source].total
-        data[source] = (total_2019, total_2020)
-    return data
-
-
-def get_total_per_industry(dataset: list[Day]) -> dict[str, tuple[float, float]]:
+    value of the total pollutants emission for that source in the baseline period
+    (2019, before Covid) and in the comparison period (2020, during Covid).
+    """
+    totals = compare_periods(dataset, baseline, comparison).source_totals.sum(axis=1)
+    return {source: (totals[0, s].item(), totals[1, s].item())
+            for s, source in enumerate(dataset.sources)}
+
+
+@instrumentation.timed
+@memoized
+def get_total_per_industry(dataset: EmissionsCube, baseline: Period = before_covid,
+                           comparison: Period = during_covid) -> dict[str, tuple[float, float]]:
     """ Return a dictionary that maps each industry to the corresponding
-    value of total pollutants emission for that industry in 2019 (before Covid)
-    and 2020 (during Covid).
-        """
-    data = {}
-    all_industries = {}
-    for source in main_sources:
-        for ind in dataset[0].pollutants["SO2"].sources[source].industries.keys():
-            all_industries[ind] = source
-    for industry in all_industries:
-        total_2019 = 0
-        total_2020 = 0
-        for day in dataset:
-            if day.date.year == 2019:
-                for p in day.pollutants.values():
-                    total_2019 += p.sources[all_industries[industry]].industries[industry]
-            else:
-                for p in day.pollutants.values():
-                    total_2020 += p.sources[all_industries[industry]].industries[industry]
-        data[industry] = (total_2019, total_2020)
-    return data
-
-
-def get_data_for_pie_chart_source(dataset: list[Day]) -> pd.DataFrame:
+    value of total pollutants emission for that industry in the baseline period
+    (2019, before Covid) and in the comparison period (2020, during Covid).
+    """
+    totals = compare_periods(dataset, baseline, comparison).industry_totals.sum(axis=1)
+    return {industry: (totals[0, i].item(), totals[1, i].item())
+            for i, industry in enumerate(dataset.industries)}
+
+
+@instrumentation.timed
+@memoized
+def get_total_per_mobile_pollutant(dataset: EmissionsCube, baseline: Period = before_covid,
+                                   comparison: Period = during_covid) \
+        -> dict[str, tuple[float, float]]:
+    """Return a dictionary that maps each pollutant to the corresponding value of its total
+    emission by mobile sources in the baseline period (2019, before Covid) and in the
+    comparison period (2020, during Covid).
+    """
+    totals = compare_periods(dataset, baseline, comparison).source_totals[
+        :, :, dataset.source_index["Mobile sources"]]
+    return {pollutant: (totals[0, p].item(), totals[1, p].item())
+            for p, pollutant in enumerate(dataset.pollutants)}
+
+
+@instrumentation.timed
+@memoized
+def get_decrease_per_source(dataset: EmissionsCube, baseline: Period = before_covid,
+                            comparison: Period = during_covid) -> dict[str, float]:
+    """Return a dictionary that maps each source of emission to the weighted decrease of its
+    total pollutant emission between the baseline and the comparison period.
+    """
+    total_2019, total_2020 = \
+        compare_periods(dataset, baseline, comparison).source_totals.sum(axis=1)
+    return dict(zip(dataset.sources, np.abs((total_2019 - total_2020) / total_2020).tolist()))
+
+
+@instrumentation.timed
+@memoized
+def get_decrease_per_industry(dataset: EmissionsCube, baseline: Period = before_covid,
+                              comparison: Period = during_covid) -> dict[str, float]:
+    """Return a dictionary that maps each industry to the weighted decrease of its total
+    pollutant emission between the baseline and the comparison period.
+    """
+    total_2019, total_2020 = \
+        compare_periods(dataset, baseline, comparison).industry_totals.sum(axis=1)
+    return dict(zip(dataset.industries,
+                    np.abs((total_2019 - total_2020) / total_2020).tolist()))
+
+
+@instrumentation.timed
+@memoized
+def get_decrease_per_mobile_pollutant(dataset: EmissionsCube, baseline: Period = before_covid,
+                                      comparison: Period = during_covid) -> dict[str, float]:
+    """Return a dictionary that maps each pollutant to the weighted decrease of its emission
+    by mobile sources between the baseline and the comparison period.
+    """
+    total_2019, total_2020 = compare_periods(dataset, baseline, comparison).source_totals[
+        :, :, dataset.source_index["Mobile sources"]]
+    return dict(zip(dataset.pollutants,
+                    np.abs((total_2020 - total_2019) / total_2019).tolist()))
+
+
+@instrumentation.timed
+def get_data_for_pie_chart_source(dataset: EmissionsCube, baseline: Period = before_covid,
+                                  comparison: Period = during_covid) -> pd.DataFrame:
     """Return a pandas Data Frame that contains the weighted decrease of total pollutant
-    emission for each source.
+    emission for each source between the baseline and the comparison period.
     """
-    data = {}
-    filtered_data = get_total_per_source(dataset)
-    for source in filtered_data:
-        data[source] = abs((filtered_data[source][0] - filtered_data[source][1])
-                           / filtered_data[source][1])
-    return pd.DataFrame.from_dict(data, orient='index')
+    import pandas as pd
+    return pd.DataFrame.from_dict(get_decrease_per_source(dataset, baseline, comparison),
+                                  orient='index')
 
 
-def get_data_for_pie_chart_industry(dataset: list[Day]) -> pd.DataFrame:
+@instrumentation.timed
+def get_data_for_pie_chart_industry(dataset: EmissionsCube, baseline: Period = before_covid,
+                                    comparison: Period = during_covid) -> pd.DataFrame:
     """Return a pandas Data Frame that contains the weighted decrease of total pollutant
-        emission for each industry.
+    emission for each industry between the baseline and the comparison period.
     """
-    data = {}
-    filtered_data = get_total_per_industry(dataset)
-    for industry in filtered_data:
-        data[industry] = abs((filtered_data[industry][0] - filtered_data[industry][1])
-                             / filtered_data[industry][1])
-    return pd.DataFrame.from_dict(data, orient='index')
+    import pandas as pd
+    return pd.DataFrame.from_dict(get_decrease_per_industry(dataset, baseline, comparison),
+                                  orient='index')
 
 
-def get_data_for_pie_chart_mobile(dataset: list[Day]) -> pd.DataFrame:
+@instrumentation.timed
+def get_data_for_pie_chart_mobile(dataset: EmissionsCube, baseline: Period = before_covid,
+                                  comparison: Period = during_covid) -> pd.DataFrame:
     """Return a pandas Data Frame that contains the weighted decrease of each pollutant
-    emission for the mobile source which was the most impacted source by covid-19.
-    """
-    data = {}
-    for p in dataset[0].pollutants:
-        total_2019 = 0
-        total_2020 = 0
-        for day in dataset:
-            if day.date.year == 2019:
-                total_2019 += day.pollutants[p].sources["Mobile sources"].total
-            else:
-                total_2020 += day.pollutants[p].sources["Mobile sources"].total
-        data[p] = abs((total_2020 - total_2019)
-                      / total_2019)
-    return pd.DataFrame.from_dict(data, orient='index')
-
-
-def get_data_for_bar_source(dataset: list[Day]) -> pd.DataFrame:
+    emission for the mobile source which was the most impacted source by covid-19,
+    between the baseline and the comparison period.
+    """
+    import pandas as pd
+    return pd.DataFrame.from_dict(
+        get_decrease_per_mobile_pollutant(dataset, baseline, comparison), orient='index')
+
+
+@instrumentation.timed
+def get_data_for_bar_source(dataset: EmissionsCube, baseline: Period = before_covid,
+                            comparison: Period = during_covid) -> pd.DataFrame:
     """ Return a Pandas Data Frame that contains the value of total pollutants emission
-    for each source in 2019 (before Covid) and 2020 (during Covid).
+    for each source in the baseline period (2019, before Covid) and in the comparison
+    period (2020, during Covid). The columns are named after the periods.
     """
-    data = get_total_per_source(dataset)
-    year_2019 = [data[source][0] for source in data]
-    year_2020 = [data[source][1] for source in data]
-    sources = data.keys()
-    return pd.DataFrame({'2019': year_2019, '2020': year_2020}, index=sources)
+    import pandas as pd
+    return pd.DataFrame.from_dict(get_total_per_source(dataset, baseline, comparison),
+                                  orient='index', columns=[baseline.name, comparison.name])
 
 
-def get_data_for_bar_industry(dataset: list[Day]) -> pd.DataFrame:
+@instrumentation.timed
+def get_data_for_bar_industry(dataset: EmissionsCube, baseline: Period = before_covid,
+                              comparison: Period = during_covid) -> pd.DataFrame:
     """ Return a Pandas Data Frame that contains the value of total pollutants emission
-    for each industry in 2019 (before Covid) and 2020 (during Covid)
+    for each industry in the baseline period (2019, before Covid) and in the comparison
+    period (2020, during Covid). The columns are named after the periods.
     """
-    data = get_total_per_industry(dataset)
-    year_2019 = [data[ind][0] for ind in data]
-    year_2020 = [data[ind][1] for ind in data]
-    industries = data.keys()
-    return pd.DataFrame({'2019': year_2019, '2020': year_2020}, index=industries)
+    import pandas as pd
+    return pd.DataFrame.from_dict(get_total_per_industry(dataset, baseline, comparison),
+                                  orient='index', columns=[baseline.name, comparison.name])
 
 
-python_ta.check_all(config={
-    'extra-imports': ["pandas", "openpyxl", "datetime"],  # the names (strs) of imported modules
-    'allowed-io': [],  # the names (strs) of functions that call print/open/input
-    'max-line-length': 100,
-    'disable': ['R1705', 'C0200']
-})
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ["bisect", "copy", "csv", "functools", "hashlib", "itertools", "json",
+                          "os", "sys", "threading", "collections", "collections.abc",
+                          "concurrent.futures", "dataclasses", "datetime", "typing", "numpy",
+                          "pandas", "openpyxl",
+                          "instrumentation"],  # the names (strs) of imported modules
+        # the names (strs) of functions that call print/open/input
+        'allowed-io': ["with_csv", "get_file_key", "raw_data_file"],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
@@ -0,0 +1,234 @@
+"""CSC110 Fall 2020 Project Final Submission
+===============================
+
+This Python module contains the timers and counters that record where the time goes when
+the dataset is loaded, organized, aggregated and drawn.
+
+Instructions as follows:
+Call enable before running the functions to measure and export_trace afterwards to write
+the recorded stages and counters to a trace file, which can be opened in chrome://tracing
+or Perfetto. Pass profile=True or memory=True to enable to also run cProfile or record
+the memory allocated in each stage with tracemalloc. While disabled, which is the default,
+the timed functions only check one flag before running.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of students
+taking CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2020 Ipek Akyol, Yumna Refai, Helia Sajjadian Moosavi .
+"""
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Optional
+
+
+class _State:
+    """
+    The recording state of the module.
+
+    Instance Attributes:
+        - enabled: whether stages and counters are being recorded
+        - events: the recorded stages, in the trace event format
+        - counters: the total of each counter
+        - profiler: the running profiler, if profile was passed to enable
+        - memory: whether the memory allocated in each stage is recorded
+        - stacks: the stack of peaks of each thread that opened a stage while memory was
+        recorded. A stack holds the highest traced memory seen so far in each open stage of
+        its thread, outermost first, not counting what tracemalloc has traced since the last
+        reset of its peak
+    """
+    enabled: bool
+    events: list[dict]
+    counters: dict[str, int]
+    profiler: Optional[cProfile.Profile]
+    memory: bool
+    stacks: list[list[int]]
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.events = []
+        self.counters = {}
+        self.profiler = None
+        self.memory = False
+        self.stacks = []
+
+
+_state = _State()
+_counters_lock = threading.Lock()
+_memory_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable(profile: bool = False, memory: bool = False) -> None:
+    """Start recording stages and counters, clearing anything recorded before.
+    If profile is True, also run cProfile until disable is called. If memory is True, also
+    record the peak memory allocated during each stage.
+    """
+    _state.events = []
+    _state.counters = {}
+    _state.memory = memory
+    _state.stacks = []
+    if memory:
+        tracemalloc.start()
+    _state.profiler = None
+    if profile:
+        _state.profiler = cProfile.Profile()
+        _state.profiler.enable()
+    _state.enabled = True
+
+
+def disable() -> None:
+    """Stop recording. What was recorded is kept until the next call to enable.
+    """
+    _state.enabled = False
+    if _state.profiler is not None:
+        _state.profiler.disable()
+    if _state.memory:
+        tracemalloc.stop()
+
+
+def is_enabled() -> bool:
+    """Return whether stages and counters are being recorded.
+    """
+    return _state.enabled
+
+
+def timed(function: Callable) -> Callable:
+    """Return the function wrapped so that each call is recorded as a stage named after the
+    function while recording is enabled.
+    """
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not _state.enabled:
+            return function(*args, **kwargs)
+        with Stage(function.__qualname__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+class Stage:
+    """
+    A context manager that records the code it runs as a stage with the given name while
+    recording is enabled.
+
+    When memory is recorded, the stage reports the peak of the traced memory during the stage
+    minus the traced memory when it started. Nested stages reset the peak of tracemalloc, so
+    each stage passes the peak it saw on to the stage around it when it ends. The open stages
+    are kept on a stack for each thread, and the peak before each reset is passed on to the
+    innermost open stage of every thread, since tracemalloc traces the whole process.
+
+    Sample Usage:
+    >>> with Stage("draw"):
+    ...     pass
+    """
+    name: str
+    args: dict
+    _start: float
+    _start_memory: int
+
+    def __init__(self, name: str, **args: Any) -> None:
+        self.name = name
+        self.args = args
+        self._start = 0.0
+        self._start_memory = 0
+
+    def __enter__(self) -> 'Stage':
+        if _state.enabled:
+            if _state.memory:
+                with _memory_lock:
+                    current, peak = tracemalloc.get_traced_memory()
+                    for peaks in _state.stacks:
+                        if peaks:
+                            peaks[-1] = max(peaks[-1], peak)
+                    tracemalloc.reset_peak()
+                    _get_peaks().append(current)
+                    self._start_memory = current
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if _state.enabled:
+            end = time.perf_counter()
+            args = dict(self.args)
+            if _state.memory:
+                with _memory_lock:
+                    peaks = _get_peaks()
+                    if peaks:
+                        peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+                        if peaks:
+                            peaks[-1] = max(peaks[-1], peak)
+                        args['peak_allocated_bytes'] = peak - self._start_memory
+            _state.events.append({'name': self.name, 'ph': 'X', 'ts': self._start * 1e6,
+                                  'dur': (end - self._start) * 1e6, 'pid': os.getpid(),
+                                  'tid': threading.get_ident(), 'args': args})
+
+
+def _get_peaks() -> list[int]:
+    """Return the stack of peaks of the open stages of the current thread, adding a new stack
+    to _state.stacks when the thread has none since recording was last enabled.
+
+    Preconditions:
+        - _memory_lock is held by the current thread
+    """
+    if getattr(_local, 'stacks', None) is not _state.stacks:
+        _local.peaks = []
+        _local.stacks = _state.stacks
+        _state.stacks.append(_local.peaks)
+    return _local.peaks
+
+
+def count(name: str, amount: int = 1) -> None:
+    """Add the amount to the counter with the given name while recording is enabled.
+    """
+    if _state.enabled:
+        with _counters_lock:
+            _state.counters[name] = _state.counters.get(name, 0) + amount
+
+
+def get_stages() -> dict[str, tuple[int, float]]:
+    """Return a dictionary that maps the name of each recorded stage to the number of times it
+    ran and its total time in seconds.
+    """
+    stages = {}
+    for event in _state.events:
+        calls, seconds = stages.get(event['name'], (0, 0.0))
+        stages[event['name']] = (calls + 1, seconds + event['dur'] / 1e6)
+    return stages
+
+
+def get_counters() -> dict[str, int]:
+    """Return a copy of the recorded counters.
+    """
+    with _counters_lock:
+        return dict(_state.counters)
+
+
+def export_trace(file_name: str) -> None:
+    """Write the recorded stages and counters to the file with the file_name in the trace
+    event format. If cProfile was run, also write its statistics to file_name + '.prof'.
+    """
+    with open(file_name, 'w') as file:
+        json.dump({'traceEvents': _state.events, 'otherData': {'counters': get_counters()}},
+                  file)
+    if _state.profiler is not None:
+        _state.profiler.dump_stats(file_name + '.prof')
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ["cProfile", "functools", "json", "os", "threading", "time",
+                          "tracemalloc", "typing"],
+        'allowed-io': ["export_trace"],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
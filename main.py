@@ -5,26 +5,31 @@ Main module: This module consists of a main block of the code necessary to
 run our entire program from start to finish.
 
 Instructions:
-Uncomment the following code one by one.
-For the first chunk of code, we intend to fit a linear regression model using a scatter plot
-for the different pollutant gases.
+Run this module with a subcommand of cli to run one part of our program, for example
 
-For the next chunk of code, we look at the pie chart and bar chart of sources which presents which source
-was affected the most/least during Covid19. Look at the source with the greatest/least
-percentage decrease using the pie chart and see the bar plots to see the change in the total pollutant gas
-emissions between 2019 (before Covid) and 2020 (during Covid).
+    python main.py compare --by source
+    python main.py regress --pollutant CO --totals-only
+    python main.py render
+
+First we fit linear regression models for the different pollutant gases (regress, and the
+linear_regression chart of render).
+
+Next we look at the pie chart and bar chart of sources which presents which source
+was affected the most/least during Covid19 (compare --by source, and the pie_chart_source and
+bar_plot_source charts). Look at the source with the greatest/least percentage decrease and
+the change in the total pollutant gas emissions between 2019 (before Covid) and 2020 (during Covid).
 
 We look at the pie chart and bar chart of industries within these sources to find out which industry
-was affected the most/least during Covid19. Look at the bar plot and see which has the largest/smallest
-wedge and compare your intuitive analysis to the data about the change in total pollutant gas emissions
- from each industry in the bar plot between 2019 (before Covid) and 2020 (during Covid).
+was affected the most/least during Covid19 (compare --by industry, and the pie_chart_industry and
+bar_plot_industry charts).
 
 From our sources bar plot and pie chart, it is clear that mobile sources was most impacted by Covid 19 so
 we made another pie chart to address our final question from our introduction to see how and which
-pollutant gases decreased most significantly due to Covid19.
+pollutant gases decreased most significantly due to Covid19 (compare --by mobile, and the
+pie_chart_mobile chart).
 
-The last chunk of code highlights how the data is used to derive the total emissions of all the pollutant
-gases per source and the total emissions of all the pollutant gases per industry within each source.
+The aggregate subcommand shows the total emissions of all the pollutant gases per source and
+per industry within each source. Run python main.py --help to see all the subcommands.
 
 Copyright and Usage Information
 ===============================
@@ -37,25 +42,9 @@ please consult our Course Syllabus.
 
 This file is Copyright (c) 2020 Ipek Akyol, Yumna Refai, Helia Sajjadian Moosavi .
 """
-import get_data
-import visualisation_functions
-
-data = get_data.get_organized_data(get_data.with_openpyxl())
-
-#visualisation_functions.draw_linear_regression("CO")
-#visualisation_functions.draw_linear_regression("CO2")
-#visualisation_functions.draw_linear_regression("NOx")
-#visualisation_functions.draw_linear_regression("SO2")
-#visualisation_functions.draw_linear_regression("NMVOCs")
-#visualisation_functions.draw_linear_regression("PM2.5")
-#visualisation_functions.draw_linear_regression("BC")
-#visualisation_functions.draw_linear_regression("OC")
-
-# visualisation_functions.draw_pie_chart_source()
-# visualisation_functions.draw_bar_plot_source()
-# visualisation_functions.draw_pie_chart_industry()
-#visualisation_functions.draw_bar_plot_industry()
-#visualisation_functions.draw_pie_chart_mobile()
-
-#get_data.get_total_per_source(data)
-get_data.get_total_per_industry(data)
+import sys
+
+import cli
+
+if __name__ == '__main__':
+    sys.exit(cli.main())
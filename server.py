@@ -0,0 +1,377 @@
+"""CSC110 Fall 2020 Project Final Submission
+===============================
+
+This Python module is a small HTTP service that answers queries about the dataset with
+JSON, so that other programs can use the results of get_data without loading the dataset
+themselves.
+
+Instructions as follows:
+Run python main.py serve to start the service on http://127.0.0.1:8000, or await
+start_server in an asyncio program. The dataset is loaded once when the service starts.
+The endpoints are:
+    - /sources: the total emission of each source in two periods and its weighted decrease
+    - /industries: the same for each industry
+    - /mobile: the same for each pollutant emitted by mobile sources
+    - /regression?pollutant=CO&degree=1: the total emission of the pollutant on each day
+    and the polynomial trend fitted to it
+    - /chart?name=pie_chart_source&format=png: the image of a chart of charts.py, read from
+    the tile cache of tiles.py when it was already rendered
+    - /health: the number of days and the version of the loaded dataset
+The first three endpoints and the charts comparing periods take the periods to compare as
+?baseline=2019&comparison=2020, in any of the forms read by get_data.parse_period.
+
+Responses are kept in a cache for the current version of the dataset, and requests for a
+response that is already being computed wait for it instead of computing it again.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of students
+taking CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2020 Ipek Akyol, Yumna Refai, Helia Sajjadian Moosavi .
+"""
+import asyncio
+import json
+import math
+from collections import OrderedDict
+from http import HTTPStatus
+from typing import Any, Callable
+from urllib.parse import parse_qsl, urlsplit
+
+import get_data
+import instrumentation
+import storage
+import tiles
+import trends
+
+response_cache_size = 256
+
+
+def get_periods(query: dict[str, str]) -> tuple[get_data.Period, get_data.Period]:
+    """Return the baseline and comparison periods given in the query, or the periods before
+    and during Covid when they are not given.
+    """
+    baseline = get_data.parse_period(query['baseline']) if 'baseline' in query \
+        else get_data.before_covid
+    comparison = get_data.parse_period(query['comparison']) if 'comparison' in query \
+        else get_data.during_covid
+    return baseline, comparison
+
+
+def _comparison_body(baseline: get_data.Period, comparison: get_data.Period,
+                     totals: dict[str, tuple[float, float]],
+                     decreases: dict[str, float]) -> dict:
+    """Return the body of a response with the totals in the two periods and the weighted
+    decrease of each name.
+    """
+    return {'baseline': baseline.name, 'comparison': comparison.name,
+            'totals': {name: {'baseline': before, 'comparison': after,
+                              'weighted_decrease': decreases[name]}
+                       for name, (before, after) in totals.items()}}
+
+
+def get_sources(dataset: get_data.EmissionsCube, query: dict[str, str]) -> dict:
+    """Return the body of the /sources endpoint.
+    """
+    baseline, comparison = get_periods(query)
+    return _comparison_body(baseline, comparison,
+                            get_data.get_total_per_source(dataset, baseline, comparison),
+                            get_data.get_decrease_per_source(dataset, baseline, comparison))
+
+
+def get_industries(dataset: get_data.EmissionsCube, query: dict[str, str]) -> dict:
+    """Return the body of the /industries endpoint.
+    """
+    baseline, comparison = get_periods(query)
+    return _comparison_body(baseline, comparison,
+                            get_data.get_total_per_industry(dataset, baseline, comparison),
+                            get_data.get_decrease_per_industry(dataset, baseline, comparison))
+
+
+def get_mobile(dataset: get_data.EmissionsCube, query: dict[str, str]) -> dict:
+    """Return the body of the /mobile endpoint.
+    """
+    baseline, comparison = get_periods(query)
+    return _comparison_body(baseline, comparison,
+                            get_data.get_total_per_mobile_pollutant(dataset, baseline,
+                                                                    comparison),
+                            get_data.get_decrease_per_mobile_pollutant(dataset, baseline,
+                                                                       comparison))
+
+
+def get_regression(dataset: get_data.EmissionsCube, query: dict[str, str]) -> dict:
+    """Return the body of the /regression endpoint.
+    """
+    pollutant = query.get('pollutant', "CO")
+    degree = int(query.get('degree', 1))
+    if pollutant not in dataset.pollutant_index:
+        raise ValueError(f"unknown pollutant: {pollutant}")
+    days = trends.get_days(dataset)
+    totals = dataset.pollutant_totals[:, dataset.pollutant_index[pollutant]]
+    coefficients, residuals, r_squared, rmse = trends.fit_polynomials(days, totals, degree)
+    return {'pollutant': pollutant, 'degree': degree, 'day': days.tolist(),
+            'total': totals.tolist(), 'trend': (totals - residuals).tolist(),
+            'coefficients': coefficients.tolist(), 'r_squared': r_squared.item(),
+            'rmse': rmse.item()}
+
+
+def get_chart(dataset: get_data.EmissionsCube, query: dict[str, str]) -> tuple[str, bytes]:
+    """Return the content type and the image of the /chart endpoint.
+    """
+    chart = query.get('name', '')
+    if chart not in tiles.chart_names:
+        raise ValueError(f"unknown chart: {chart}")
+    image_format = query.get('format', 'png')
+    if image_format not in image_types:
+        raise ValueError(f"unknown image format: {image_format}")
+    if chart == "linear_regression":
+        params = {'pollutant': query.get('pollutant', "CO")}
+        if params['pollutant'] not in dataset.pollutant_index:
+            raise ValueError(f"unknown pollutant: {params['pollutant']}")
+    else:
+        baseline, comparison = get_periods(query)
+        params = {'baseline': baseline, 'comparison': comparison}
+    return image_types[image_format], tiles.render_tile(chart, dataset, image_format, **params)
+
+
+def get_health(dataset: get_data.EmissionsCube, query: dict[str, str]) -> dict:
+    """Return the body of the /health endpoint.
+    """
+    return {'days': len(dataset), 'version': dataset.version,
+            'last_day': dataset.dates[-1].date().isoformat() if dataset.dates else None}
+
+
+endpoints = {
+    '/sources': get_sources,
+    '/industries': get_industries,
+    '/mobile': get_mobile,
+    '/regression': get_regression,
+    '/chart': get_chart
+}
+
+image_types = {'png': 'image/png', 'svg': 'image/svg+xml', 'pdf': 'application/pdf'}
+
+
+class QueryService:
+    """
+    The HTTP service answering queries about the dataset in a file.
+
+    Instance Attributes:
+        - file_name: the name of the file of the dataset, as passed to storage.get_dataset
+        - cache_size: the largest number of responses kept in the cache
+
+    Representation Invariants:
+        - self.cache_size >= 0
+    """
+    file_name: str
+    cache_size: int
+    # Private Instance Attributes:
+    #   - _cache: the content type and body of the most recently used responses, keyed on the
+    #     version of the dataset, the path and the query of the request
+    #   - _pending: the responses being computed, with the same keys
+    _cache: OrderedDict
+    _pending: dict[tuple, asyncio.Future]
+
+    def __init__(self, file_name: str = get_data.file_path,
+                 cache_size: int = response_cache_size) -> None:
+        self.file_name = file_name
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._pending = {}
+
+    async def respond(self, method: str, target: str) -> tuple[HTTPStatus, str, bytes]:
+        """Return the status, the content type and the body of the response to the request with
+        the given method for the target.
+        """
+        url = urlsplit(target)
+        if method not in ('GET', 'HEAD'):
+            return HTTPStatus.METHOD_NOT_ALLOWED, *_error(f"{method} is not allowed")
+        if url.path == '/health':
+            return (HTTPStatus.OK,
+                    *self._encode(get_health, storage.get_dataset(self.file_name), {}))
+        if url.path not in endpoints:
+            return HTTPStatus.NOT_FOUND, *_error(f"no endpoint {url.path}")
+
+        dataset = storage.get_dataset(self.file_name)
+        query = dict(parse_qsl(url.query))
+        key = (dataset.version, url.path, tuple(sorted(query.items())))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            instrumentation.count("response cache hits")
+            return (HTTPStatus.OK, *self._cache[key])
+        if key in self._pending:
+            instrumentation.count("requests coalesced")
+            try:
+                return await self._pending[key]
+            except Exception as error:
+                return (HTTPStatus.INTERNAL_SERVER_ERROR, *_error(repr(error)))
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            content = await asyncio.get_running_loop().run_in_executor(
+                None, self._encode, endpoints[url.path], dataset, query)
+        except ValueError as error:
+            response = (HTTPStatus.BAD_REQUEST, *_error(str(error)))
+            future.set_result(response)
+        except Exception as error:
+            # The requests waiting for this response get the error too. Reading it back marks
+            # it as retrieved, so asyncio does not log it when no request was waiting.
+            response = (HTTPStatus.INTERNAL_SERVER_ERROR, *_error(repr(error)))
+            future.set_exception(error)
+            future.exception()
+        else:
+            response = (HTTPStatus.OK, *content)
+            self._cache[key] = content
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            future.set_result(response)
+        finally:
+            del self._pending[key]
+            if not future.done():
+                future.cancel()
+        return response
+
+    @staticmethod
+    def _encode(endpoint: Callable, dataset: get_data.EmissionsCube,
+                query: dict[str, str]) -> tuple[str, bytes]:
+        """Return the content type and the body of the response of the endpoint to the query.
+        The endpoint returns either the body of a JSON response as a dictionary, or the content
+        type and the body of another response.
+        """
+        with instrumentation.Stage(endpoint.__name__):
+            result = endpoint(dataset, query)
+        if isinstance(result, dict):
+            return 'application/json', json.dumps(_finite(result), allow_nan=False).encode()
+        else:
+            return result
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer the requests of one connection until the client closes it or asks to close
+        it. A malformed request is answered with 400 Bad Request and the connection is closed,
+        since where the next request starts is unknown.
+        """
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                    if not request_line.strip():
+                        break
+                    method, target, version, headers = \
+                        await _read_head(request_line.decode('latin-1'), reader)
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError(f"invalid content length: {length}")
+                except ValueError as error:
+                    content_type, body = _error(f"malformed request: {error}")
+                    writer.write(_head(HTTPStatus.BAD_REQUEST, content_type, len(body), False))
+                    writer.write(body)
+                    await writer.drain()
+                    break
+                keep_alive = version == 'HTTP/1.1' \
+                    and headers.get('connection', '').lower() != 'close' \
+                    and 'transfer-encoding' not in headers
+                # No endpoint reads a body, but it is read to find where the next request starts.
+                await reader.readexactly(length)
+                status, content_type, body = await self.respond(method, target)
+                writer.write(_head(status, content_type, len(body), keep_alive))
+                if method != 'HEAD':
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _read_head(request_line: str, reader: asyncio.StreamReader) \
+        -> tuple[str, str, str, dict[str, str]]:
+    """Return the method, target and version of the request with the request_line and its
+    headers, read from the reader, with lowercase names.
+
+    Raise ValueError if the request line does not have three parts or a header line is too
+    long.
+    """
+    parts = request_line.split()
+    if len(parts) != 3:
+        raise ValueError(f"invalid request line: {request_line.strip()!r}")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return parts[0], parts[1], parts[2], headers
+
+
+def _head(status: HTTPStatus, content_type: str, length: int, keep_alive: bool) -> bytes:
+    """Return the status line and headers of a response with a body of the given content type
+    and length.
+    """
+    return (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {length}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1')
+
+
+def _finite(value: Any) -> Any:
+    """Return the value with every infinite or NaN float in it, at any depth of its
+    dictionaries and lists, replaced by None, which is written as null in JSON.
+
+    >>> _finite({'a': [1.0, float('inf')], 'b': float('nan')})
+    {'a': [1.0, None], 'b': None}
+    """
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    elif isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    elif isinstance(value, list):
+        return [_finite(item) for item in value]
+    else:
+        return value
+
+
+def _error(message: str) -> tuple[str, bytes]:
+    """Return the content type and the JSON body of a response with the error message.
+    """
+    return 'application/json', json.dumps({'error': message}).encode()
+
+
+async def start_server(host: str = '127.0.0.1', port: int = 8000,
+                       file_name: str = get_data.file_path, **settings: Any) -> asyncio.Server:
+    """Load the dataset in the file with the file_name and return a server answering queries
+    about it on the host and port. Pass port 0 to listen on any free port.
+
+    The settings are passed on to QueryService.
+    """
+    await asyncio.get_running_loop().run_in_executor(None, storage.get_dataset, file_name)
+    service = QueryService(file_name, **settings)
+    return await asyncio.start_server(service.handle, host, port)
+
+
+async def serve(host: str = '127.0.0.1', port: int = 8000,
+                file_name: str = get_data.file_path) -> None:
+    """Answer queries about the dataset in the file with the file_name on the host and port
+    until the task is cancelled.
+    """
+    server = await start_server(host, port, file_name)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ["asyncio", "json", "math", "collections", "http", "typing",
+                          "urllib.parse", "get_data", "instrumentation", "storage", "tiles",
+                          "trends"],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
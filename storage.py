@@ -0,0 +1,398 @@
+"""CSC110 Fall 2020 Project Final Submission
+===============================
+
+This Python module contains the functions to save the organized dataset to disk
+and to load it back, so that the dataset file only has to be parsed again when it changes.
+
+Instructions as follows:
+Call get_dataset to get the organized dataset shared by all modules of the process. It is
+loaded with load_cached_data the first time it is needed. The arrays of the dataset are kept
+in a .npz file and the names of the pollutants, sources and industries are kept in a .json
+index file next to it.
+
+Datasets too large to fit in memory, such as several years of data for several regions, are
+saved with save_store and opened with open_store. Each region of a store is a folder with one
+.npy file for each array of the dataset, and open_store maps these files into memory instead
+of reading them. New days are added to a region with append_store, which only writes the
+new days.
+
+Other programs can read the dataset from a Parquet file written by export_parquet, in long
+format with one row for each day, pollutant, source and industry. The rows of each year and
+pollutant form a separate row group, so readers that filter on the date or the pollutant, like
+import_parquet, only read the row groups they need. Parquet files need the pyarrow package.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of students
+taking CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2020 Ipek Akyol, Yumna Refai, Helia Sajjadian Moosavi .
+"""
+import io
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+import get_data
+
+cache_folder = r'.cache'
+store_folder = r'store'
+
+_cube_arrays = ['pollutant_totals', 'source_totals', 'industry_totals']
+
+parquet_path = r'emissions.parquet'
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+
+def get_source_key(file_name: str) -> dict:
+    """Return a dictionary that identifies the current contents of the file with the file_name,
+    made of its size, its modification time and the sha256 hash of its contents.
+    """
+    return get_data.get_file_key(file_name)
+
+
+def save_cube(cube: get_data.EmissionsCube, path: str, source_key: dict) -> None:
+    """Save the cube to the files path + '.npz' and path + '.json'.
+
+    The index file is written last, so a cache entry is only visible once both files are
+    complete.
+    """
+    folder = os.path.dirname(path)
+    if folder != '':
+        os.makedirs(folder, exist_ok=True)
+    with open(path + '.npz.tmp', 'wb') as file:
+        np.savez(file, dates=np.array(cube.dates, dtype='datetime64[us]'),
+                 industry_sources=cube.industry_sources,
+                 pollutant_totals=cube.pollutant_totals,
+                 source_totals=cube.source_totals,
+                 industry_totals=cube.industry_totals)
+    os.replace(path + '.npz.tmp', path + '.npz')
+    index = {'source': source_key, 'pollutants': cube.pollutants, 'sources': cube.sources,
+             'industries': cube.industries}
+    with open(path + '.json.tmp', 'w') as file:
+        json.dump(index, file)
+    os.replace(path + '.json.tmp', path + '.json')
+
+
+def load_cube(path: str) -> get_data.EmissionsCube:
+    """Return the cube saved to the files path + '.npz' and path + '.json' by save_cube.
+    """
+    with open(path + '.json') as file:
+        index = json.load(file)
+    with np.load(path + '.npz') as arrays:
+        return get_data.EmissionsCube(arrays['dates'].tolist(), index['pollutants'],
+                                      index['sources'], index['industries'],
+                                      arrays['industry_sources'], arrays['pollutant_totals'],
+                                      arrays['source_totals'], arrays['industry_totals'])
+
+
+def load_cached_data(file_name: str = get_data.file_path,
+                     folder: str = cache_folder) -> get_data.EmissionsCube:
+    """Return the organized dataset in the file with the file_name, reading it from the cache
+    in the folder when the file has not changed since the cache was written.
+
+    The cache is kept for the file that get_data.load_raw_data reads, which is the csv file
+    with the same name while the file has not changed since the csv file was first read. A
+    file with the same size and modification time as when it was cached is assumed to be
+    unchanged. Otherwise its hash is compared with the cached one, and the dataset is parsed
+    again and cached only when the contents are different.
+    """
+    source_name = get_data.raw_data_file(file_name, folder)
+    path = os.path.join(os.path.dirname(source_name), folder, os.path.basename(source_name))
+    stat = os.stat(source_name)
+    try:
+        with open(path + '.json') as file:
+            cached_key = json.load(file)['source']
+    except (OSError, ValueError, KeyError):
+        cached_key = None
+
+    if cached_key is not None and (cached_key['size'], cached_key['mtime_ns']) \
+            == (stat.st_size, stat.st_mtime_ns):
+        return load_cube(path)
+
+    source_key = get_source_key(source_name)
+    if cached_key is not None and cached_key['sha256'] == source_key['sha256']:
+        cube = load_cube(path)
+    else:
+        cube = get_data.get_organized_data(get_data.load_raw_data(source_name))
+    save_cube(cube, path, source_key)
+    return cube
+
+
+def save_store(cube: get_data.EmissionsCube, folder: str = store_folder,
+               region: str = 'all') -> None:
+    """Save the cube as the given region of the dataset store in the folder.
+    """
+    path = os.path.join(folder, region)
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'dates.npy'), np.array(cube.dates, dtype='datetime64[us]'))
+    np.save(os.path.join(path, 'industry_sources.npy'), cube.industry_sources)
+    for name, running in zip(_cube_arrays, cube.running_totals()):
+        np.save(os.path.join(path, name + '.npy'), getattr(cube, name))
+        np.save(os.path.join(path, name + '_running.npy'), running)
+    index = {'pollutants': cube.pollutants, 'sources': cube.sources,
+             'industries': cube.industries}
+    with open(os.path.join(path, 'index.json'), 'w') as file:
+        json.dump(index, file)
+
+
+def open_store(folder: str = store_folder, region: str = 'all') -> get_data.EmissionsCube:
+    """Return the given region of the dataset store in the folder as a cube whose arrays are
+    memory-mapped read-only from disk.
+
+    Only the parts of the arrays that are used are read, so slices of the cube made with
+    EmissionsCube.between or EmissionsCube.select_pollutant stay cheap on large stores. The
+    running totals of the cube are saved in the store too, so range totals over the whole
+    store are answered without reading the daily values.
+    """
+    path = os.path.join(folder, region)
+    with open(os.path.join(path, 'index.json')) as file:
+        index = json.load(file)
+    arrays = [np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in _cube_arrays]
+    running = tuple(np.load(os.path.join(path, name + '_running.npy'), mmap_mode='r')
+                    for name in _cube_arrays)
+    return get_data.EmissionsCube(np.load(os.path.join(path, 'dates.npy')).tolist(),
+                                  index['pollutants'], index['sources'], index['industries'],
+                                  np.load(os.path.join(path, 'industry_sources.npy')), *arrays,
+                                  running=running)
+
+
+def append_store(new_days: get_data.EmissionsCube, folder: str = store_folder,
+                 region: str = 'all') -> None:
+    """Add the days of new_days to the end of the given region of the dataset store in the
+    folder, continuing its running totals from the last day already in the store.
+
+    Raise ValueError, leaving the region unchanged, if the days of new_days are not after the
+    last day of the region or if new_days does not have the same pollutants, sources and
+    industries as the region. The dates are written after all the arrays, so the days of the
+    region only grow once their values are complete.
+    """
+    path = os.path.join(folder, region)
+    stored = open_store(folder, region)
+    if stored.dates and new_days.dates and new_days.dates[0] <= stored.dates[-1]:
+        raise ValueError(f"new days must start after {stored.dates[-1]}")
+    for names in ['pollutants', 'sources', 'industries']:
+        if getattr(new_days, names) != getattr(stored, names):
+            raise ValueError(f"the {names} of the new days do not match the store")
+    for name in _cube_arrays:
+        shape = getattr(new_days, name).shape
+        if shape != (len(new_days.dates),) + getattr(stored, name).shape[1:]:
+            raise ValueError(f"the {name} of the new days have shape {shape}")
+
+    rows = {}
+    for name, running in zip(_cube_arrays, stored.running):
+        values = getattr(new_days, name)
+        rows[name] = values
+        rows[name + '_running'] = running[-1] + np.cumsum(values, axis=0)
+    for name, values in rows.items():
+        _append_rows(os.path.join(path, name + '.npy'), values)
+    _append_rows(os.path.join(path, 'dates.npy'),
+                 np.array(new_days.dates, dtype='datetime64[us]'))
+
+
+def _append_rows(file_name: str, rows: np.ndarray) -> None:
+    """Append the rows to the end of the array saved in the .npy file with the file_name.
+
+    Only the header of the file is rewritten; numpy leaves enough space in the header for the
+    length of the array to grow. Raise ValueError, leaving the file unchanged, if the new
+    header does not fit in that space.
+    """
+    with open(file_name, 'r+b') as file:
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+        header_size = file.tell()
+        rows = np.ascontiguousarray(rows, dtype=dtype)
+        header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': fortran_order,
+                  'shape': (shape[0] + rows.shape[0],) + tuple(shape[1:])}
+        buffer = io.BytesIO()
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(buffer, header)
+        else:
+            np.lib.format.write_array_header_2_0(buffer, header)
+        if buffer.tell() != header_size:
+            raise ValueError(f"the header of {file_name} cannot grow in place")
+        file.seek(0)
+        file.write(buffer.getvalue())
+        file.seek(0, os.SEEK_END)
+        file.write(rows.tobytes())
+
+
+def get_store_regions(folder: str = store_folder) -> list[str]:
+    """Return the names of the regions saved in the dataset store in the folder.
+    """
+    return sorted(name for name in os.listdir(folder)
+                  if os.path.exists(os.path.join(folder, name, 'index.json')))
+
+
+def get_dataset(file_name: str = get_data.file_path) -> get_data.EmissionsCube:
+    """Return the organized dataset in the file with the file_name, loading it only the first
+    time it is requested in this process.
+
+    The running totals of the dataset are computed when it is loaded, so every range total
+    asked for afterwards takes constant time.
+    """
+    with _datasets_lock:
+        if file_name not in _datasets:
+            _datasets[file_name] = load_cached_data(file_name)
+            _datasets[file_name].running_totals()
+        return _datasets[file_name]
+
+
+def set_dataset(cube: get_data.EmissionsCube, file_name: str = get_data.file_path) -> None:
+    """Replace the dataset returned by get_dataset for the file with the file_name by the cube,
+    dropping the results memoized from the replaced dataset.
+    """
+    with _datasets_lock:
+        if file_name in _datasets:
+            get_data.clear_memo(_datasets[file_name])
+        _datasets[file_name] = cube
+
+
+def append_dataset(data: get_data.RawData, file_name: str = get_data.file_path) \
+        -> get_data.EmissionsCube:
+    """Add the days in the data table to the dataset returned by get_dataset for the file with
+    the file_name and return the updated dataset.
+    """
+    cube = get_data.append_days(get_dataset(file_name), get_data.get_organized_data(data))
+    set_dataset(cube, file_name)
+    return cube
+
+
+def _import_pyarrow() -> tuple:
+    """Return the pyarrow, pyarrow.compute and pyarrow.parquet modules, raising an ImportError
+    that explains how to install pyarrow if it is missing.
+    """
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("reading and writing Parquet files needs the pyarrow package, "
+                          "install it with: pip install pyarrow") from None
+    return pyarrow, pyarrow.compute, pyarrow.parquet
+
+
+def export_parquet(cube: get_data.EmissionsCube, file_name: str = parquet_path) -> None:
+    """Write the cube to the Parquet file with the file_name in long format, with the columns
+    date, pollutant, source, industry and value_tons.
+
+    The emission of a pollutant by an industry is a row with both a source and an industry,
+    the emission by a whole source is a row with no industry, and the total emission of the
+    pollutant is a row with neither. The pollutant, source and industry columns are dictionary
+    encoded, and the rows of each year and pollutant are written as one row group. The names
+    of the cube are kept in the metadata of the file, so import_parquet can rebuild the cube
+    in the same order.
+    """
+    pa, _, pq = _import_pyarrow()
+    dictionaries = [pa.array(names, pa.string())
+                    for names in [cube.pollutants, cube.sources, cube.industries]]
+    series_sources = np.concatenate([[-1], np.arange(len(cube.sources)),
+                                     cube.industry_sources]).astype(np.int32)
+    series_industries = np.concatenate([np.full(1 + len(cube.sources), -1),
+                                        np.arange(len(cube.industries))]).astype(np.int32)
+    metadata = {'pollutants': cube.pollutants, 'sources': cube.sources,
+                'industries': cube.industries,
+                'industry_sources': np.asarray(cube.industry_sources).tolist()}
+    schema = pa.schema([('date', pa.date32()),
+                        ('pollutant', pa.dictionary(pa.int32(), pa.string())),
+                        ('source', pa.dictionary(pa.int32(), pa.string())),
+                        ('industry', pa.dictionary(pa.int32(), pa.string())),
+                        ('value_tons', pa.float64())],
+                       metadata={'emissions': json.dumps(metadata)})
+    dates = np.array(cube.dates, dtype='datetime64[D]')
+    years = cube.years()
+    with pq.ParquetWriter(file_name, schema,
+                          use_dictionary=['pollutant', 'source', 'industry']) as writer:
+        for year in sorted(set(years.tolist())):
+            a, b = np.searchsorted(years, [year, year + 1])
+            for p in range(len(cube.pollutants)):
+                values = np.concatenate([cube.pollutant_totals[a:b, p][None],
+                                         np.transpose(cube.source_totals[a:b, p]),
+                                         np.transpose(cube.industry_totals[a:b, p])])
+                sources = np.repeat(series_sources, b - a)
+                industries = np.repeat(series_industries, b - a)
+                writer.write_table(pa.table([
+                    pa.array(np.tile(dates[a:b], len(values)), pa.date32()),
+                    pa.DictionaryArray.from_arrays(np.full(values.size, p, np.int32),
+                                                   dictionaries[0]),
+                    pa.DictionaryArray.from_arrays(sources, dictionaries[1], mask=sources < 0),
+                    pa.DictionaryArray.from_arrays(industries, dictionaries[2],
+                                                   mask=industries < 0),
+                    pa.array(values.ravel())], schema=schema), row_group_size=values.size)
+
+
+def import_parquet(file_name: str = parquet_path, start: datetime = datetime.min,
+                   end: datetime = datetime.max,
+                   pollutants: Optional[list[str]] = None) -> get_data.EmissionsCube:
+    """Return the cube written to the Parquet file with the file_name by export_parquet, with
+    only the days from start up to but not including end and only the given pollutants, or
+    all of them if pollutants is None.
+
+    The filters are pushed down to the reader, so row groups of other years or pollutants are
+    not read from the file.
+
+    Preconditions:
+        - pollutants is None or all the pollutants are in the file
+    """
+    pa, pc, pq = _import_pyarrow()
+    with open(file_name, 'rb') as file:
+        metadata = json.loads(pq.read_schema(file).metadata[b'emissions'])
+    if pollutants is None:
+        pollutants = metadata['pollutants']
+    else:
+        pollutants = [pollutant for pollutant in metadata['pollutants']
+                      if pollutant in pollutants]
+    filters = [('pollutant', 'in', pollutants)]
+    if start != datetime.min:
+        filters.append(('date', '>=', start.date()))
+    if end != datetime.max:
+        filters.append(('date', '<', end.date()))
+    table = pq.read_table(file_name, filters=filters)
+
+    day_values = table.column('date').to_numpy()
+    dates = np.unique(day_values)
+    days = np.searchsorted(dates, day_values)
+    p, s, i = [pc.fill_null(pc.index_in(table.column(column).cast(pa.string()),
+                                        value_set=pa.array(names, pa.string())), -1).to_numpy()
+               for column, names in [('pollutant', pollutants), ('source', metadata['sources']),
+                                     ('industry', metadata['industries'])]]
+    values = table.column('value_tons').to_numpy()
+
+    shape = (len(dates), len(pollutants))
+    pollutant_totals = np.zeros(shape)
+    source_totals = np.zeros(shape + (len(metadata['sources']),))
+    industry_totals = np.zeros(shape + (len(metadata['industries']),))
+    rows = s < 0
+    pollutant_totals[days[rows], p[rows]] = values[rows]
+    rows = (s >= 0) & (i < 0)
+    source_totals[days[rows], p[rows], s[rows]] = values[rows]
+    rows = i >= 0
+    industry_totals[days[rows], p[rows], i[rows]] = values[rows]
+    return get_data.EmissionsCube(dates.astype('datetime64[us]').tolist(), pollutants,
+                                  metadata['sources'], metadata['industries'],
+                                  np.array(metadata['industry_sources']), pollutant_totals,
+                                  source_totals, industry_totals)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ["io", "json", "os", "threading", "datetime", "typing", "numpy",
+                          "pyarrow", "pyarrow.compute", "pyarrow.parquet", "get_data"],
+        'allowed-io': ["save_cube", "load_cube", "load_cached_data",
+                       "save_store", "open_store", "_append_rows", "import_parquet"],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
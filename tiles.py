@@ -0,0 +1,185 @@
+"""CSC110 Fall 2020 Project Final Submission
+===============================
+
+This Python module keeps the images of the charts rendered by charts.py in a cache on disk,
+so a chart that was already rendered for the same data is read back instead of drawn again.
+
+Instructions as follows:
+Call render_tile instead of charts.render to get the image of a chart. Each image is saved
+in the tile folder under a hash of everything it depends on: the contents of the dataset, the
+chart, its parameters, the image format and the code of charts.py, get_data.py and trends.py
+with the version of matplotlib. When any of them changes, the chart is drawn again under a new
+name, so cached images never need to be invalidated. When the folder grows past its size limit,
+the images used least recently are deleted.
+
+Reading an image from the cache does not import matplotlib.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of students
+taking CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2020 Ipek Akyol, Yumna Refai, Helia Sajjadian Moosavi .
+"""
+import functools
+import hashlib
+import json
+import os
+import threading
+from importlib import metadata
+from typing import Any, Optional
+
+import numpy as np
+
+import get_data
+import instrumentation
+import storage
+
+tile_folder = os.path.join(storage.cache_folder, 'tiles')
+tile_cache_bytes = 64 << 20
+digest_chunk_size = 1 << 20
+
+chart_names = ["pie_chart_source", "bar_plot_source", "pie_chart_industry",
+               "bar_plot_industry", "pie_chart_mobile", "linear_regression"]
+
+_tiles_lock = threading.Lock()
+
+
+def get_params(chart: str, params: dict[str, Any]) -> dict[str, Any]:
+    """Return the params of the chart with the parameters that are not given filled in with
+    the defaults of its drawing function in charts.py, so that a chart drawn with its default
+    parameters has the same name in the cache however they were passed.
+    """
+    if chart == "linear_regression":
+        return {'pollutant': "CO", **params}
+    else:
+        return {'baseline': get_data.before_covid, 'comparison': get_data.during_covid,
+                **params}
+
+
+@get_data.memoized
+def get_dataset_digest(dataset: get_data.EmissionsCube) -> str:
+    """Return the sha256 hash of the contents of the dataset: its days, the names of its
+    pollutants, sources and industries and all of its daily totals.
+
+    The arrays are hashed a few rows at a time without copying them, so the arrays of a
+    dataset memory-mapped from a store are never loaded into memory all at once.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(date) for date in dataset.dates], dataset.pollutants,
+                              dataset.sources, dataset.industries]).encode())
+    for values in [np.asarray(dataset.industry_sources), dataset.pollutant_totals,
+                   dataset.source_totals, dataset.industry_totals]:
+        digest.update(f"{values.shape} {values.dtype.str}".encode())
+        rows = max(1, digest_chunk_size // max(1, values[:1].size))
+        for start in range(0, len(values), rows):
+            digest.update(memoryview(np.ascontiguousarray(values[start:start + rows])))
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def get_style_digest() -> str:
+    """Return the sha256 hash of the code that draws the charts: the contents of charts.py, of
+    get_data.py and trends.py, which compute the values they draw, and the version of
+    matplotlib.
+    """
+    digest = hashlib.sha256(metadata.version('matplotlib').encode())
+    for module in ['charts.py', 'get_data.py', 'trends.py']:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module), 'rb') \
+                as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def get_tile_key(chart: str, dataset: get_data.EmissionsCube, image_format: str, dpi: int,
+                 params: dict[str, Any]) -> str:
+    """Return the name of the cached image of the chart drawn from the dataset with the params,
+    in the image_format at the given dpi.
+    """
+    key = {'dataset': get_dataset_digest(dataset), 'style': get_style_digest(), 'chart': chart,
+           'format': image_format, 'dpi': dpi,
+           'params': {name: repr(value) for name, value in params.items()}}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+@instrumentation.timed
+def render_tile(chart: str, dataset: Optional[get_data.EmissionsCube] = None,
+                image_format: str = 'png', dpi: int = 100, folder: str = tile_folder,
+                max_bytes: int = tile_cache_bytes, **params: Any) -> bytes:
+    """Return the image of the chart with the given name like charts.render, reading it from
+    the cache in the folder when it was already rendered, or else rendering it and adding it
+    to the cache. The cache is kept under max_bytes by deleting the images used least
+    recently.
+
+    Preconditions:
+        - chart in chart_names
+    """
+    if dataset is None:
+        dataset = storage.get_dataset()
+    params = get_params(chart, params)
+    path = os.path.join(folder, f"{get_tile_key(chart, dataset, image_format, dpi, params)}"
+                                f".{image_format}")
+    try:
+        with open(path, 'rb') as file:
+            image = file.read()
+        os.utime(path)
+        instrumentation.count("tile cache hits")
+        return image
+    except FileNotFoundError:
+        instrumentation.count("tile cache misses")
+
+    import charts
+    image = charts.render(chart, dataset, image_format, dpi, **params)
+    os.makedirs(folder, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, 'wb') as file:
+        file.write(image)
+    os.replace(temporary, path)
+    evict_tiles(folder, max_bytes)
+    return image
+
+
+def evict_tiles(folder: str = tile_folder, max_bytes: int = tile_cache_bytes) -> None:
+    """Delete the images in the cache in the folder that were used least recently until the
+    images left take at most max_bytes.
+
+    The time an image was last used is its modification time, which render_tile updates on
+    every read, so this also works on file systems that do not record access times.
+    """
+    if not os.path.isdir(folder):
+        return
+    with _tiles_lock:
+        tiles = []
+        for entry in os.scandir(folder):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                tiles.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in tiles)
+        for _, size, path in sorted(tiles):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def clear_tiles(folder: str = tile_folder) -> None:
+    """Delete every image in the cache in the folder.
+    """
+    evict_tiles(folder, 0)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ["functools", "hashlib", "json", "os", "threading", "importlib",
+                          "typing", "numpy", "get_data", "instrumentation", "storage", "charts"],
+        'allowed-io': ["get_style_digest", "render_tile"],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200', 'C0415']
+    })
@@ -0,0 +1,272 @@
+"""CSC110 Fall 2020 Project Final Submission
+===============================
+
+This Python module contains the functions that fit trend lines to every daily series of
+the dataset at once: the total of each pollutant, and each pollutant emitted by each source
+and by each industry.
+
+Instructions as follows:
+Call fit_trends with the organized dataset and the degree of the polynomial to fit, for
+example fit_trends(storage.get_dataset(), 2) for the quadratic shape that the linear model
+of draw_linear_regression misses. The results are arrays with one column per series, in the
+order of get_series.
+
+Call cross_validate to measure how well the trends predict days they were not fitted on,
+with shuffled k-fold or time-series splits, and bootstrap for confidence intervals on the
+coefficients. Both run in a pool of processes and give the same results for the same seed
+whatever the number of processes.
+
+Copyright and Usage Information
+===============================
+
+This file is provided solely for the personal and private use of students
+taking CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2020 Ipek Akyol, Yumna Refai, Helia Sajjadian Moosavi .
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+import numpy as np
+
+import get_data
+import instrumentation
+
+first_day = datetime(2019, 1, 1)
+
+bootstrap_chunk_size = 100
+
+
+@dataclass
+class TrendFit:
+    """
+    The polynomial trends fitted to many daily series of emissions.
+
+    Instance Attributes:
+        - degree: the degree of the fitted polynomials
+        - series: the (pollutant, name) of each series, where name is "Total" for the total
+        of the pollutant, or the name of a source or industry
+        - coefficients: the coefficients of the polynomial of each series, highest power
+        first, with shape (degree + 1, series)
+        - residuals: the actual value minus the fitted value of each series on each day,
+        with shape (days, series)
+        - r_squared: the coefficient of determination of each fit
+        - rmse: the root mean squared error of each fit
+
+    Representation Invariants:
+        - self.degree >= 0
+        - self.coefficients.shape == (self.degree + 1, len(self.series))
+    """
+    degree: int
+    series: list[tuple[str, str]]
+    coefficients: np.ndarray
+    residuals: np.ndarray
+    r_squared: np.ndarray
+    rmse: np.ndarray
+
+    def slopes(self) -> np.ndarray:
+        """Return the slope of each linear fit, in tons per day.
+
+        Preconditions:
+            - self.degree == 1
+        """
+        return self.coefficients[0]
+
+    def coefficients_of(self, pollutant: str, name: str = "Total") -> np.ndarray:
+        """Return the coefficients of the fit of the series of the pollutant emitted by the
+        source or industry with the given name, or of the total of the pollutant.
+        """
+        return self.coefficients[:, self.series.index((pollutant, name))]
+
+
+def get_days(dataset: get_data.EmissionsCube) -> np.ndarray:
+    """Return the number of days from the 1st of January 2019 to each day of the dataset,
+    the same x values as get_data.get_data_for_linear_regression.
+    """
+    return np.array([(date - first_day).days for date in dataset.dates], dtype=float)
+
+
+def get_series(dataset: get_data.EmissionsCube) -> tuple[list[tuple[str, str]], np.ndarray]:
+    """Return the (pollutant, name) of every series of the dataset and an array with the
+    values of all the series on each day, with shape (days, series).
+
+    The series are the total of each pollutant, followed by each pollutant emitted by each
+    source, followed by each pollutant emitted by each industry.
+    """
+    days = len(dataset)
+    labels = [(pollutant, "Total") for pollutant in dataset.pollutants]
+    labels.extend((pollutant, source) for pollutant in dataset.pollutants
+                  for source in dataset.sources)
+    labels.extend((pollutant, industry) for pollutant in dataset.pollutants
+                  for industry in dataset.industries)
+    values = np.concatenate([dataset.pollutant_totals.reshape(days, -1),
+                             dataset.source_totals.reshape(days, -1),
+                             dataset.industry_totals.reshape(days, -1)], axis=1)
+    return labels, values
+
+
+def fit_polynomials(x: np.ndarray, values: np.ndarray, degree: int) \
+        -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Return the coefficients, residuals, coefficients of determination and root mean
+    squared errors of the least-squares polynomials of the given degree fitted to each
+    column of values against x, all solved together.
+
+    Preconditions:
+        - values.shape[0] == len(x)
+        - len(x) > degree
+    """
+    coefficients = np.polyfit(x, values, degree)
+    residuals = values - np.vander(x, degree + 1) @ coefficients
+    ss_res = (residuals ** 2).sum(axis=0)
+    ss_tot = ((values - values.mean(axis=0)) ** 2).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_squared = np.where(ss_tot > 0, 1 - ss_res / ss_tot, 1.0)
+    return coefficients, residuals, r_squared, np.sqrt(ss_res / len(x))
+
+
+@instrumentation.timed
+def fit_trends(dataset: get_data.EmissionsCube, degree: int = 1) -> TrendFit:
+    """Return the polynomial trends of the given degree of every series of the dataset
+    against the number of days since the 1st of January 2019.
+
+    Preconditions:
+        - len(dataset) > degree
+    """
+    labels, values = get_series(dataset)
+    coefficients, residuals, r_squared, rmse = fit_polynomials(get_days(dataset), values,
+                                                               degree)
+    return TrendFit(degree, labels, coefficients, residuals, r_squared, rmse)
+
+
+@dataclass
+class BootstrapFit:
+    """
+    The bootstrap confidence intervals of the coefficients of polynomial trends.
+
+    Instance Attributes:
+        - degree: the degree of the fitted polynomials
+        - series: the (pollutant, name) of each series, like in TrendFit
+        - confidence: the confidence level of the intervals
+        - samples: the number of bootstrap samples
+        - lower: the lower bound of each coefficient of each series, highest power first,
+        with shape (degree + 1, series)
+        - upper: the upper bound of each coefficient of each series, with the same shape
+        - standard_error: the standard deviation of each coefficient over the samples,
+        with the same shape
+
+    Representation Invariants:
+        - 0 < self.confidence < 1
+        - (self.lower <= self.upper).all()
+    """
+    degree: int
+    series: list[tuple[str, str]]
+    confidence: float
+    samples: int
+    lower: np.ndarray
+    upper: np.ndarray
+    standard_error: np.ndarray
+
+
+@instrumentation.timed
+def cross_validate(dataset: get_data.EmissionsCube, degree: int = 1, folds: int = 5,
+                   time_series: bool = False, seed: int = 0,
+                   processes: Optional[int] = None) -> np.ndarray:
+    """Return the root mean squared error of the trends of the given degree of every series of
+    the dataset on each held-out fold, as an array with shape (folds, series).
+
+    If time_series is False, the days are shuffled with the seed and split into folds, and each
+    fold is predicted from all the other days. Otherwise the days are split in order into
+    folds + 1 blocks, and each block after the first is predicted from all the blocks before it.
+
+    Preconditions:
+        - folds >= 2
+        - len(dataset) >= 2 * (folds + 1) * (degree + 1)
+    """
+    _, values = get_series(dataset)
+    x = get_days(dataset)
+    if time_series:
+        blocks = np.array_split(np.arange(len(x)), folds + 1)
+        splits = [(np.concatenate(blocks[:k]), blocks[k]) for k in range(1, folds + 1)]
+    else:
+        shuffled = np.array_split(np.random.default_rng(seed).permutation(len(x)), folds)
+        splits = [(np.concatenate(shuffled[:k] + shuffled[k + 1:]), shuffled[k])
+                  for k in range(folds)]
+    tasks = [(x, values, degree, train, test) for train, test in splits]
+    return np.stack(_run(_fold_rmse, tasks, processes))
+
+
+@instrumentation.timed
+def bootstrap(dataset: get_data.EmissionsCube, degree: int = 1, samples: int = 1000,
+              confidence: float = 0.95, seed: int = 0,
+              processes: Optional[int] = None) -> BootstrapFit:
+    """Return the percentile bootstrap confidence intervals of the coefficients of the trends
+    of the given degree of every series of the dataset, refitting all the series on samples
+    resamplings of the days.
+
+    The samples are drawn in chunks of bootstrap_chunk_size, each with its own random
+    generator derived from the seed, so the result only depends on the seed.
+
+    Preconditions:
+        - samples >= 1
+        - 0 < confidence < 1
+    """
+    labels, values = get_series(dataset)
+    x = get_days(dataset)
+    sizes = [min(bootstrap_chunk_size, samples - start)
+             for start in range(0, samples, bootstrap_chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(x, values, degree, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+    coefficients = np.concatenate(_run(_bootstrap_chunk, tasks, processes))
+    tail = (1 - confidence) / 2 * 100
+    lower, upper = np.percentile(coefficients, [tail, 100 - tail], axis=0)
+    return BootstrapFit(degree, labels, confidence, samples, lower, upper,
+                        coefficients.std(axis=0, ddof=1) if samples > 1
+                        else np.zeros_like(lower))
+
+
+def _run(function: Callable, tasks: list[tuple], processes: Optional[int]) -> list:
+    """Return the results of calling the function on each of the tasks, in a pool of processes
+    unless processes is 1.
+    """
+    if processes == 1:
+        return [function(*task) for task in tasks]
+    with ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(function, *zip(*tasks)))
+
+
+def _fold_rmse(x: np.ndarray, values: np.ndarray, degree: int, train: np.ndarray,
+               test: np.ndarray) -> np.ndarray:
+    """Return the root mean squared error on the test days of the trends of every series
+    fitted on the train days.
+    """
+    coefficients = np.polyfit(x[train], values[train], degree)
+    errors = values[test] - np.vander(x[test], degree + 1) @ coefficients
+    return np.sqrt((errors ** 2).mean(axis=0))
+
+
+def _bootstrap_chunk(x: np.ndarray, values: np.ndarray, degree: int, size: int,
+                     seed: np.random.SeedSequence) -> np.ndarray:
+    """Return the coefficients of the trends of every series fitted on size resamplings of the
+    days drawn with the seed, with shape (size, degree + 1, series).
+    """
+    rng = np.random.default_rng(seed)
+    coefficients = np.empty((size, degree + 1, values.shape[1]))
+    for k in range(size):
+        days = rng.integers(0, len(x), len(x))
+        coefficients[k] = np.polyfit(x[days], values[days], degree)
+    return coefficients
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ["concurrent.futures", "dataclasses", "datetime", "typing", "numpy",
+                          "get_data", "instrumentation"],
+        'allowed-io': [],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
@@ -19,32 +19,27 @@ expressly prohibited.
 
 This file is Copyright (c) 2020 Ipek Akyol, Yumna Refai, Helia Sajjadian Moosavi .
 """
-import random
-
 import matplotlib.pyplot as plt
-import numpy as np
-import python_ta
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
 import get_data
-
-data = get_data.get_organized_data(get_data.with_openpyxl())
+import instrumentation
+import storage
 
 
+@instrumentation.timed
 def draw_pie_chart_source() -> None:
     """ Draws a pie chart that compares the weighted decrease of emission for each source.
     """
-    get_data.get_data_for_pie_chart_source(data).plot.pie(autopct='%1.0f%%', subplots=True)
+    get_data.get_data_for_pie_chart_source(storage.get_dataset()).plot.pie(autopct='%1.0f%%', subplots=True)
     plt.title('Weighted Decrease in Pollutant Emissions by Each Source')
     plt.legend(title='Types of Sources', bbox_to_anchor=(0.9, 0.3), loc='best')
 
 
+@instrumentation.timed
 def draw_bar_plot_source() -> None:
     """ Draws a bar plot that shows the total of all the pollutant gases
     emitted by each source in 2019(before Covid) and in 2020 (during Covid).
     """
-    get_data.get_data_for_bar_source(data).plot.bar()
+    get_data.get_data_for_bar_source(storage.get_dataset()).plot.bar()
     plt.xticks(fontsize=8, rotation=10)
     plt.xlabel('Type of Sources', fontsize=8)
     plt.ylabel('Total of All the Pollutant Gases Emitted (tons)', fontsize=8)
@@ -54,10 +49,11 @@ def draw_bar_plot_source() -> None:
                title_fontsize=8)
 
 
+@instrumentation.timed
 def draw_pie_chart_industry() -> None:
     """ Draws a pie chart that compares the weighted decrease of emission for each industry.
     """
-    p = get_data.get_data_for_pie_chart_industry(data)
+    p = get_data.get_data_for_pie_chart_industry(storage.get_dataset())
     industries_of_sources = list(p.index.values)
     p.plot.pie(subplots=True, labels=None)
     plt.legend(fontsize=5, bbox_to_anchor=(0.1, 0.6), loc='best', labels=industries_of_sources,
@@ -66,11 +62,12 @@ def draw_pie_chart_industry() -> None:
     plt.title('Weighted decrease of emission for each industry')
 
 
+@instrumentation.timed
 def draw_bar_plot_industry() -> None:
     """ Draws a bar plot that shows the total of all the pollutant gases emitted by
     each source in 2019(before Covid) and in 2020 (during Covid)
     """
-    get_data.get_data_for_bar_industry(data).plot.bar()
+    get_data.get_data_for_bar_industry(storage.get_dataset()).plot.bar()
     plt.xticks(fontsize=6)
     plt.xlabel('Type of Industries', fontsize=8)
     plt.tight_layout()
@@ -81,17 +78,19 @@ def draw_bar_plot_industry() -> None:
                loc='best', title_fontsize=8)
 
 
+@instrumentation.timed
 def draw_pie_chart_mobile() -> None:
     """ Draws a pie chart that compares the weighted decrease of emission for each pollutant
     produced by mobile sources (which was found to be the most affected source during Covid19)
     """
-    q = get_data.get_data_for_pie_chart_mobile(data)
+    q = get_data.get_data_for_pie_chart_mobile(storage.get_dataset())
     pollutants_gases = (list(q.index.values))
     q.plot.pie(autopct='%1.0f%%', subplots=True, labels=None)
     plt.legend(fontsize=5, bbox_to_anchor=(0.1, 0.6), loc='best', labels=pollutants_gases, title='Types of Pollutants')
     plt.title('The Weighted decrease of emission for each pollutant produced by Mobile Sources', fontsize=8)
 
 
+@instrumentation.timed
 def draw_linear_regression(pollutant: str) -> None:
     """ Draws a linear regression model for the given pollutant.
     (Disclaimer:- This has failed because the graph took a quadratic shape instead of linear).
@@ -100,8 +99,12 @@ def draw_linear_regression(pollutant: str) -> None:
     Preconditions:
       - pollutant in {"CO","CO2","SO2","NOx","NMVOCs","PM2.5","BC","OC"}
     """
+    import numpy as np
+    import pandas as pd
+    from sklearn.linear_model import LinearRegression
+    from sklearn.model_selection import train_test_split
 
-    df = get_data.get_data_for_linear_regression(data, pollutant)
+    df = get_data.get_data_for_linear_regression(storage.get_dataset(), pollutant)
 
     print(df)
     print(type(df))
@@ -133,9 +136,12 @@ def draw_linear_regression(pollutant: str) -> None:
     print(df)
 
 
-python_ta.check_all(config={
-    'extra-imports': ["matplotlib.pyplot", "numpy", "sklearn.linear_model",
-                      "sklearn.model_selection", "train_test_split", "LinearRegression", "get_data"],
-    'allowed-io': ["draw"],  # the names (strs) of functions that call print/open/input
-    'max-line-length': 200,
-})
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ["matplotlib.pyplot", "numpy", "sklearn.linear_model",
+                          "sklearn.model_selection", "train_test_split", "LinearRegression", "get_data",
+                          "instrumentation", "storage"],
+        'allowed-io': ["draw"],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 200,
+    })